@@ -0,0 +1,131 @@
+"""
+Admission control - bounded concurrency and queueing per resource class.
+Each class (llm, local_model, ocr, tts) runs at most ``limit`` requests at a
+time and lets at most ``queue`` more wait, each for at most ``max_wait``
+seconds. Anything beyond that is turned away immediately (429 when the queue
+is full, 503 when the wait deadline passes) with a Retry-After estimate, so an
+overload shows up as fast rejections instead of a swapping box and timeouts.
+"""
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from app.core.config import parse_limits, settings
+
+
+class ResourceClass:
+    def __init__(self, name: str, limit: int, queue: int, max_wait: float):
+        self.name = name
+        self.limit = max(1, int(limit))
+        self.queue = int(queue)
+        self.max_wait = max_wait
+        self._semaphore = None
+        self.active = 0
+        self.waiting = 0
+        self._service_time = 1.0
+        self.stats = {"admitted": 0, "rejected_full": 0, "rejected_timeout": 0, "total_wait": 0.0}
+
+    def _slots(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free, from the recent average service time."""
+        backlog = (self.waiting + 1) / self.limit
+        return max(1, math.ceil(backlog * self._service_time))
+
+    def _reject(self, status: int, reason: str):
+        raise HTTPException(
+            status_code=status,
+            detail=f"Server busy ({self.name}): {reason}. Please retry shortly.",
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    async def acquire(self, background: bool = False):
+        """Take a slot or raise 429/503. ``background`` callers (jobs) wait without a deadline."""
+        slots = self._slots()
+        start = time.monotonic()
+        if not slots.locked():
+            # Free slot - take it without queueing
+            await slots.acquire()
+        else:
+            if not background and self.waiting >= self.queue:
+                self.stats["rejected_full"] += 1
+                self._reject(429, "queue full")
+            self.waiting += 1
+            try:
+                if background:
+                    await slots.acquire()
+                else:
+                    await asyncio.wait_for(slots.acquire(), self.max_wait)
+            except asyncio.TimeoutError:
+                self.stats["rejected_timeout"] += 1
+                self._reject(503, "queue wait exceeded")
+            finally:
+                self.waiting -= 1
+                self.stats["total_wait"] += time.monotonic() - start
+        self.active += 1
+        self.stats["admitted"] += 1
+        return time.monotonic()
+
+    def release(self, started: float):
+        self.active -= 1
+        # Exponential moving average of how long a slot is held
+        self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - started)
+        self._slots().release()
+
+    def releaser(self, started: float):
+        """A release callback for a slot held across callbacks; calls after the first are no-ops."""
+        held = [True]
+
+        def release():
+            if held[0]:
+                held[0] = False
+                self.release(started)
+        return release
+
+    @asynccontextmanager
+    async def admit(self, background: bool = False):
+        started = await self.acquire(background)
+        try:
+            yield
+        finally:
+            self.release(started)
+
+    def metrics(self) -> dict:
+        rejected = self.stats["rejected_full"] + self.stats["rejected_timeout"]
+        decided = self.stats["admitted"] + rejected
+        return {
+            "limit": self.limit,
+            "queue_limit": self.queue,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "admitted": self.stats["admitted"],
+            "rejected_full": self.stats["rejected_full"],
+            "rejected_timeout": self.stats["rejected_timeout"],
+            "rejection_rate": round(rejected / decided, 3) if decided else 0.0,
+            "avg_wait_ms": round(self.stats["total_wait"] / decided * 1000) if decided else 0,
+            "avg_service_s": round(self._service_time, 2),
+        }
+
+
+_limits = parse_limits(settings.ADMISSION_LIMITS)
+_queues = parse_limits(settings.ADMISSION_QUEUES)
+_waits = parse_limits(settings.ADMISSION_MAX_WAIT)
+
+
+def _resource(name: str) -> ResourceClass:
+    return ResourceClass(name, _limits.get(name, 4), _queues.get(name, 16), _waits.get(name, 10.0))
+
+
+llm = _resource("llm")
+local_model = _resource("local_model")
+ocr = _resource("ocr")
+tts = _resource("tts")
+
+
+def metrics() -> dict:
+    return {r.name: r.metrics() for r in (llm, local_model, ocr, tts)}
@@ -0,0 +1,137 @@
+"""
+Caches shared by the backend: a process-local TTL/LRU cache and a size-bounded
+SQLite LRU table for caches that live on disk under CACHE_DIR.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+
+
+def text_key(text: str) -> str:
+    """Hash of the text with Unicode and whitespace differences normalized away."""
+    normalized = " ".join(unicodedata.normalize("NFC", text).split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a TTL (``ttl=None`` never expires)."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = float("inf") if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class SQLiteLRU:
+    """A SQLite table with ``size`` and ``last_used`` columns, trimmed least recently used
+    first once its sizes add up to more than ``max_bytes``.
+
+    The total is summed from the table itself, so every process sharing the file
+    enforces the same budget. ``schema`` creates the table (plus any companion tables);
+    callers run their queries through ``run`` and call ``trim`` after inserting.
+    """
+
+    def __init__(self, path: str, table: str, key_columns: tuple, schema: str, max_bytes: int):
+        self.path = path
+        self.table = table
+        self.key_columns = key_columns
+        self.schema = schema
+        self.max_bytes = max_bytes
+        self.evicted = 0
+        self.last_size = 0
+        self._where = " and ".join(f"{c}=?" for c in key_columns)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.schema)
+            conn.execute(f"create index if not exists {self.table}_last_used on {self.table}(last_used)")
+            self.last_size = self.size(conn)
+            self._conn = conn
+        return self._conn
+
+    def run(self, fn, *args):
+        """``fn(conn, *args)`` under the lock, committed afterwards. Blocking."""
+        with self._lock:
+            conn = self._db()
+            result = fn(conn, *args)
+            conn.commit()
+            return result
+
+    def touch(self, conn: sqlite3.Connection, key: tuple):
+        conn.execute(f"update {self.table} set last_used=? where {self._where}", (time.time(), *key))
+
+    def size(self, conn: sqlite3.Connection) -> int:
+        return conn.execute(f"select coalesce(sum(size), 0) from {self.table}").fetchone()[0]
+
+    def trim(self, conn: sqlite3.Connection) -> list:
+        """Once over budget, drop least recently used rows until under 90% of it; their keys."""
+        total = self.size(conn)
+        doomed = []
+        if total > self.max_bytes:
+            target = int(self.max_bytes * 0.9)
+            columns = ", ".join(self.key_columns)
+            for *key, size in conn.execute(f"select {columns}, size from {self.table} order by last_used"):
+                if total <= target:
+                    break
+                doomed.append(tuple(key))
+                total -= size
+            conn.executemany(f"delete from {self.table} where {self._where}", doomed)
+            self.evicted += len(doomed)
+        self.last_size = total
+        return doomed
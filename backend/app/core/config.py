@@ -28,6 +28,16 @@ if not os.getenv("SUPABASE_URL") and env_path.exists():
         pass
 
 
+def parse_limits(spec: str) -> dict:
+    """Parse "chat=8,analyze=4" into {"chat": 8.0, "analyze": 4.0}."""
+    limits = {}
+    for part in spec.split(","):
+        if "=" in part:
+            key, value = part.split("=", 1)
+            limits[key.strip()] = float(value)
+    return limits
+
+
 class Settings:
     PROJECT_NAME: str = "PolicyMitr API"
     VERSION: str = "2.0.0"
@@ -36,10 +46,152 @@ class Settings:
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
     SUPABASE_KEY: str = os.getenv("SUPABASE_KEY", "")
     SUPABASE_SERVICE_KEY: str = os.getenv("SUPABASE_SERVICE_KEY", "")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "16"))
+    DB_MAX_CONNECTIONS: int = int(os.getenv("DB_MAX_CONNECTIONS", "32"))
+    DB_MAX_KEEPALIVE: int = int(os.getenv("DB_MAX_KEEPALIVE", "16"))
+    DB_KEEPALIVE_EXPIRY: float = float(os.getenv("DB_KEEPALIVE_EXPIRY", "60"))
+    DB_TIMEOUT: float = float(os.getenv("DB_TIMEOUT", "30"))
+    DB_HTTP2: bool = os.getenv("DB_HTTP2", "false").lower() == "true"
+
+    # Auth - "local" verifies JWTs in-process, "remote" asks Supabase Auth every time
+    AUTH_VERIFY_MODE: str = os.getenv("AUTH_VERIFY_MODE", "local").lower()
+    SUPABASE_JWT_SECRET: str = os.getenv("SUPABASE_JWT_SECRET", "")
+    SUPABASE_JWT_AUDIENCE: str = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+    SUPABASE_JWKS_URL: str = os.getenv(
+        "SUPABASE_JWKS_URL",
+        f"{os.getenv('SUPABASE_URL', '').rstrip('/')}/auth/v1/.well-known/jwks.json",
+    )
+    JWKS_CACHE_TTL: int = int(os.getenv("JWKS_CACHE_TTL", "600"))
+    AUTH_TOKEN_CACHE_SIZE: int = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+    AUTH_TOKEN_CACHE_TTL: int = int(os.getenv("AUTH_TOKEN_CACHE_TTL", "300"))
+    PROFILE_CACHE_SIZE: int = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+    PROFILE_CACHE_TTL: int = int(os.getenv("PROFILE_CACHE_TTL", "600"))
+
+    # Write-behind audit queue (activity_logs, chat_history)
+    AUDIT_QUEUE_SIZE: int = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+    AUDIT_BATCH_SIZE: int = int(os.getenv("AUDIT_BATCH_SIZE", "100"))
+    AUDIT_FLUSH_INTERVAL: float = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))
+    AUDIT_MAX_RETRIES: int = int(os.getenv("AUDIT_MAX_RETRIES", "3"))
+    AUDIT_SHUTDOWN_TIMEOUT: float = float(os.getenv("AUDIT_SHUTDOWN_TIMEOUT", "10"))
 
     # AI
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
+    GEMINI_PRIMARY_MODEL: str = os.getenv("GEMINI_PRIMARY_MODEL", "gemini-2.5-flash")
+    GEMINI_FALLBACK_MODEL: str = os.getenv("GEMINI_FALLBACK_MODEL", "gemini-2.5-flash-lite")
+
+    # Client-side quotas (requests / tokens per minute) and circuit breaker for the model router
+    GEMINI_PRIMARY_RPM: int = int(os.getenv("GEMINI_PRIMARY_RPM", "1000"))
+    GEMINI_PRIMARY_TPM: int = int(os.getenv("GEMINI_PRIMARY_TPM", "1000000"))
+    GEMINI_FALLBACK_RPM: int = int(os.getenv("GEMINI_FALLBACK_RPM", "4000"))
+    GEMINI_FALLBACK_TPM: int = int(os.getenv("GEMINI_FALLBACK_TPM", "4000000"))
+    LLM_MAX_QUOTA_WAIT: float = float(os.getenv("LLM_MAX_QUOTA_WAIT", "10"))
+    LLM_ROUTER_WINDOW: int = int(os.getenv("LLM_ROUTER_WINDOW", "50"))
+    LLM_ROUTER_ERROR_THRESHOLD: float = float(os.getenv("LLM_ROUTER_ERROR_THRESHOLD", "0.5"))
+    LLM_ROUTER_COOLDOWN: float = float(os.getenv("LLM_ROUTER_COOLDOWN", "30"))
+
+    # Hedged requests - opt-in per endpoint ("chat,recommendations"); the delay is
+    # LLM_HEDGE_PERCENTILE of the endpoint's recent primary latency
+    LLM_HEDGE_ENDPOINTS: str = os.getenv("LLM_HEDGE_ENDPOINTS", "")
+    LLM_HEDGE_PERCENTILE: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+    LLM_HEDGE_MIN_SAMPLES: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+    LLM_HEDGE_DEFAULT_DELAY: float = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "8"))
+    LLM_HEDGE_MIN_DELAY: float = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1"))
+
+    # Prompt token budgets (context_packer)
+    LLM_CONTEXT_TOKEN_BUDGET: int = int(os.getenv("LLM_CONTEXT_TOKEN_BUDGET", "3000"))
+    LLM_HISTORY_TOKEN_BUDGET: int = int(os.getenv("LLM_HISTORY_TOKEN_BUDGET", "800"))
+    LLM_ANALYSIS_TOKEN_BUDGET: int = int(os.getenv("LLM_ANALYSIS_TOKEN_BUDGET", "3750"))
+
+    # Map-reduce analysis of documents larger than LLM_ANALYSIS_TOKEN_BUDGET
+    LLM_MAP_REDUCE: bool = os.getenv("LLM_MAP_REDUCE", "true").lower() == "true"
+    LLM_SECTION_TOKEN_BUDGET: int = int(os.getenv("LLM_SECTION_TOKEN_BUDGET", "3000"))
+    LLM_MAP_CONCURRENCY: int = int(os.getenv("LLM_MAP_CONCURRENCY", "4"))
+
+    # Clause embeddings + vector retrieval (match_clauses)
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "models/gemini-embedding-001")
+    EMBEDDING_DIM: int = int(os.getenv("EMBEDDING_DIM", "1536"))
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+    EMBEDDING_CONCURRENCY: int = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+    EMBEDDING_TIMEOUT: float = float(os.getenv("EMBEDDING_TIMEOUT", "30"))
+    RAG_TOP_K: int = int(os.getenv("RAG_TOP_K", "8"))
+    RAG_MATCH_THRESHOLD: float = float(os.getenv("RAG_MATCH_THRESHOLD", "0.5"))
+
+    # Semantic answer cache (per policy, keyed by query embedding)
+    ANSWER_CACHE_THRESHOLD: float = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+    ANSWER_CACHE_TTL: float = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+    ANSWER_CACHE_MAX_POLICIES: int = int(os.getenv("ANSWER_CACHE_MAX_POLICIES", "500"))
+    ANSWER_CACHE_MAX_PER_POLICY: int = int(os.getenv("ANSWER_CACHE_MAX_PER_POLICY", "200"))
+
+    # Offline (no Gemini key) chat retrieval - BM25 index cache per policy
+    RETRIEVAL_INDEX_CACHE_SIZE: int = int(os.getenv("RETRIEVAL_INDEX_CACHE_SIZE", "256"))
+    RETRIEVAL_INDEX_CACHE_TTL: float = float(os.getenv("RETRIEVAL_INDEX_CACHE_TTL", "3600"))
+
+    # LLM call limits - per-endpoint values are "endpoint=value" lists
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+    LLM_ENDPOINT_CONCURRENCY: str = os.getenv(
+        "LLM_ENDPOINT_CONCURRENCY", "chat=16,translate=8,analyze=4,compare=4,recommendations=4"
+    )
+    LLM_SINGLE_FLIGHT: bool = os.getenv("LLM_SINGLE_FLIGHT", "true").lower() == "true"
+    LLM_TIMEOUT: float = float(os.getenv("LLM_TIMEOUT", "60"))
+    LLM_ENDPOINT_TIMEOUTS: str = os.getenv(
+        "LLM_ENDPOINT_TIMEOUTS", "chat=45,translate=30,analyze=90,compare=60,recommendations=30"
+    )
+
+    # Local caches (SQLite files live under CACHE_DIR)
+    CACHE_DIR: str = os.getenv("CACHE_DIR", str(BASE_DIR / "cache"))
+    TRANSLATION_CACHE_PATH: str = os.getenv(
+        "TRANSLATION_CACHE_PATH", str(Path(CACHE_DIR) / "translations.db")
+    )
+    TRANSLATION_CACHE_MEMORY_ITEMS: int = int(os.getenv("TRANSLATION_CACHE_MEMORY_ITEMS", "2000"))
+    TRANSLATION_CACHE_MAX_MB: int = int(os.getenv("TRANSLATION_CACHE_MAX_MB", "200"))
+    DOCUMENT_STORE_PATH: str = os.getenv("DOCUMENT_STORE_PATH", str(Path(CACHE_DIR) / "documents.db"))
+    DOCUMENT_STORE_MAX_MB: int = int(os.getenv("DOCUMENT_STORE_MAX_MB", "500"))
+
+    # Admission control per resource class (see core/admission.py): concurrent slots,
+    # how many more may queue, and how long (seconds) they may wait
+    ADMISSION_LIMITS: str = os.getenv("ADMISSION_LIMITS", "llm=24,local_model=2,ocr=2,tts=8")
+    ADMISSION_QUEUES: str = os.getenv("ADMISSION_QUEUES", "llm=48,local_model=4,ocr=4,tts=16")
+    ADMISSION_MAX_WAIT: str = os.getenv("ADMISSION_MAX_WAIT", "llm=15,local_model=30,ocr=30,tts=10")
+
+    # Local BART summarizer: chunks per generate() call (0 = derive from free memory,
+    # assuming SUMMARIZER_BATCH_MEMORY_MB per sequence)
+    SUMMARIZER_MAX_BATCH_SIZE: int = int(os.getenv("SUMMARIZER_MAX_BATCH_SIZE", "0"))
+    SUMMARIZER_BATCH_MEMORY_MB: int = int(os.getenv("SUMMARIZER_BATCH_MEMORY_MB", "512"))
+    # Where local models run: "local" (in this process) or "sidecar" (app/inference_server.py,
+    # shared by all API workers; reached over INFERENCE_SOCKET, or INFERENCE_URL if set)
+    INFERENCE_MODE: str = os.getenv("INFERENCE_MODE", "local").lower()
+    INFERENCE_SOCKET: str = os.getenv("INFERENCE_SOCKET", "/tmp/policymitr-inference.sock")
+    INFERENCE_URL: str = os.getenv("INFERENCE_URL", "")
+    INFERENCE_TIMEOUT: float = float(os.getenv("INFERENCE_TIMEOUT", "180"))
+    INFERENCE_HEALTH_INTERVAL: float = float(os.getenv("INFERENCE_HEALTH_INTERVAL", "10"))
+    INFERENCE_HEALTH_TIMEOUT: float = float(os.getenv("INFERENCE_HEALTH_TIMEOUT", "2"))
+
+    # Local inference pool (BART-CNN, BART-MNLI, Argos) and torch intra-op threads (0 = torch default)
+    LOCAL_INFERENCE_THREADS: int = int(os.getenv("LOCAL_INFERENCE_THREADS", "2"))
+    TORCH_NUM_THREADS: int = int(os.getenv("TORCH_NUM_THREADS", "0"))
+    # Local model runtime: "torch" (PyTorch, FP16 on CUDA) or "onnx" (int8 ONNX Runtime on CPU,
+    # exported with scripts/export_onnx.py; falls back to torch when the export is missing)
+    INFERENCE_BACKEND: str = os.getenv("INFERENCE_BACKEND", "torch").lower()
+    ONNX_SUMMARIZER_DIR: str = os.getenv("ONNX_SUMMARIZER_DIR", str(BASE_DIR.parent / "models" / "bart-summarizer-onnx"))
+    ONNX_CLASSIFIER_DIR: str = os.getenv("ONNX_CLASSIFIER_DIR", str(BASE_DIR.parent / "models" / "classifier-onnx"))
+    # ONNX Runtime threads per session (0 = cores / LOCAL_INFERENCE_THREADS, so the pool doesn't oversubscribe)
+    ONNX_INTRA_OP_THREADS: int = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+    # Cross-request batching window for local inference (inference_batcher.py)
+    INFERENCE_BATCH_WINDOW_MS: float = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "20"))
+    INFERENCE_CLASSIFY_MAX_BATCH: int = int(os.getenv("INFERENCE_CLASSIFY_MAX_BATCH", "16"))
+
+    # Background upload jobs (durable SQLite queue + spooled files under CACHE_DIR)
+    JOB_DB_PATH: str = os.getenv("JOB_DB_PATH", str(Path(CACHE_DIR) / "jobs.db"))
+    JOB_SPOOL_DIR: str = os.getenv("JOB_SPOOL_DIR", str(Path(CACHE_DIR) / "uploads"))
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_QUEUE_LIMIT: int = int(os.getenv("JOB_QUEUE_LIMIT", "20"))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_RETENTION_HOURS: float = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+    # A running job's lease is renewed while its process is alive; once it lapses
+    # (process died) another worker requeues the job. Workers and SSE watchers poll the DB.
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", "1"))
 
     # CORS
     ALLOWED_ORIGINS: list = os.getenv(
@@ -0,0 +1,120 @@
+"""
+Data-access layer: the shared Supabase client plus non-blocking query execution.
+supabase-py's client is synchronous, so every ``.execute()`` is run on a bounded
+thread pool instead of the event loop; one slow PostgREST call no longer stalls
+the other requests served by the same worker.
+
+One client (and one keep-alive HTTP connection pool) lives for the whole
+process; ``startup``/``shutdown`` are called from the app lifespan in main.py.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from supabase import ClientOptions, create_client
+from .config import settings
+
+_client = None
+_http = None
+_client_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=settings.DB_POOL_SIZE, thread_name_prefix="supabase")
+
+# Connection-pool counters (requests sent vs. new TCP connections opened)
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "connections_opened": 0}
+
+
+def _count(key: str):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def _trace(event_name: str, info: dict):
+    if event_name == "connection.connect_tcp.complete":
+        _count("connections_opened")
+
+
+def _on_request(request: httpx.Request):
+    request.extensions["trace"] = _trace
+    _count("requests")
+
+
+def _create_http_client() -> httpx.Client:
+    """Keep-alive HTTP pool shared by PostgREST, Auth and Storage calls."""
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=settings.DB_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.DB_MAX_KEEPALIVE,
+            keepalive_expiry=settings.DB_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(settings.DB_TIMEOUT),
+        http2=settings.DB_HTTP2,
+        follow_redirects=True,
+        event_hooks={"request": [_on_request]},
+    )
+
+
+def get_client():
+    """Service-role client for backend operations (bypasses RLS), created once per process."""
+    global _client, _http
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _http = _create_http_client()
+                _client = create_client(
+                    settings.SUPABASE_URL,
+                    settings.SUPABASE_SERVICE_KEY,
+                    options=ClientOptions(httpx_client=_http, auto_refresh_token=False, persist_session=False),
+                )
+    return _client
+
+
+def startup():
+    """Create the client eagerly so the first request does not pay for it."""
+    get_client()
+    print(f"[DB] Supabase client ready (pool: {settings.DB_MAX_CONNECTIONS} connections, "
+          f"{settings.DB_POOL_SIZE} query threads)")
+
+
+def shutdown():
+    """Close the pooled HTTP connections."""
+    global _client, _http
+    with _client_lock:
+        if _http is not None:
+            _http.close()
+        _client = None
+        _http = None
+
+
+def pool_stats() -> dict:
+    with _stats_lock:
+        requests, opened = _stats["requests"], _stats["connections_opened"]
+    return {
+        "requests": requests,
+        "connections_opened": opened,
+        "connections_reused": max(0, requests - opened),
+        "max_connections": settings.DB_MAX_CONNECTIONS,
+        "query_threads": settings.DB_POOL_SIZE,
+    }
+
+
+def table(name: str):
+    """Start a query builder on ``name``; pass the finished builder to ``execute``."""
+    return get_client().table(name)
+
+
+def rpc(fn: str, params: dict = None):
+    """Start a Postgres function call; pass it to ``execute``."""
+    return get_client().rpc(fn, params or {})
+
+
+async def run(fn, *args, **kwargs):
+    """Run a blocking Supabase call on the DB thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def execute(query):
+    """Execute a prepared query builder without blocking the event loop."""
+    return await run(query.execute)
@@ -1,13 +1,63 @@
 """
 Security module: JWT verification using Supabase.
+Tokens are verified in-process (see core/tokens.py) unless AUTH_VERIFY_MODE=remote.
 Auto-creates user profile if it doesn't exist.
 """
+import asyncio
+import jwt
 from fastapi import Depends, HTTPException, Header
-from supabase import create_client
 from ..core.config import settings
+from ..core import db, tokens
+from ..core.cache import TTLCache
 
-# Service-role client for backend operations (bypasses RLS)
-supabase_admin = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+# Profile id → {"role": ...} for profiles known to exist ("role": None = not read yet)
+_profiles = TTLCache(maxsize=settings.PROFILE_CACHE_SIZE, ttl=settings.PROFILE_CACHE_TTL)
+
+
+async def _ensure_profile(user):
+    """Look up the user's profile (and role), creating it if missing."""
+    try:
+        profile = await db.execute(db.table("profiles").select("id, role").eq("id", user.id).single())
+        if not profile.data:
+            print("DEBUG: Profile not found (checked via admin), creating...")
+            raise Exception("No profile")
+        _profiles.set(user.id, {"role": profile.data.get("role")})
+    except Exception:
+        try:
+            # Create profile
+            await db.execute(db.table("profiles").upsert({
+                "id": user.id,
+                "full_name": user.user_metadata.get("full_name", "User"),
+                "email": user.email
+            }))
+            _profiles.set(user.id, {"role": None})
+            print("DEBUG: Profile created/upserted.")
+        except Exception as e:
+            print(f"DEBUG: Profile auto-create failed: {e} (Non-fatal)")
+
+
+async def _verify_remote(token: str):
+    """Verify the JWT by asking Supabase Auth (one network round trip)."""
+    user_response = await db.run(db.get_client().auth.get_user, token)
+    if not user_response or not user_response.user:
+        print("DEBUG: Invalid token response from Supabase")
+        raise HTTPException(status_code=401, detail="Invalid token")
+    tokens.remember(token, user_response.user, tokens.unverified_expiry(token))
+    return user_response.user
+
+
+async def _verify(token: str):
+    """Verify locally when configured, falling back to Supabase Auth otherwise."""
+    if settings.AUTH_VERIFY_MODE == "remote":
+        return await _verify_remote(token)
+    try:
+        if tokens.needs_jwks(token):
+            # The JWKS lookup may fetch over the network - keep it off the event loop
+            return await asyncio.to_thread(tokens.verify_token, token)
+        return tokens.verify_token(token)
+    except tokens.TokenConfigError as e:
+        print(f"DEBUG: Local JWT verification unavailable ({e}), using Supabase Auth")
+        return await _verify_remote(token)
 
 
 async def get_current_user(authorization: str = Header(None)):
@@ -20,32 +70,12 @@ async def get_current_user(authorization: str = Header(None)):
     print(f"DEBUG: Verifying token: {token[:10]}...")
 
     try:
-        # Verify the JWT using Supabase auth
-        user_response = supabase_admin.auth.get_user(token)
-        if not user_response or not user_response.user:
-            print("DEBUG: Invalid token response from Supabase")
-            raise HTTPException(status_code=401, detail="Invalid token")
-
-        user = user_response.user
+        user = tokens.cached_user(token) or await _verify(token)
         print(f"DEBUG: User verified: {user.id}")
 
-        # Auto-create profile if missing (resilient)
-        try:
-            profile = supabase_admin.table("profiles").select("id").eq("id", user.id).single().execute()
-            if not profile.data:
-                print("DEBUG: Profile not found (checked via admin), creating...")
-                raise Exception("No profile")
-        except Exception:
-            try:
-                # Create profile
-                supabase_admin.table("profiles").upsert({
-                    "id": user.id,
-                    "full_name": user.user_metadata.get("full_name", "User"),
-                    "email": user.email
-                }).execute()
-                print("DEBUG: Profile created/upserted.")
-            except Exception as e:
-                print(f"DEBUG: Profile auto-create failed: {e} (Non-fatal)")
+        # Auto-create profile if missing (resilient); skipped once the profile is known
+        if _profiles.get(user.id) is None:
+            await _ensure_profile(user)
 
         return user
         #         }).execute()
@@ -56,6 +86,9 @@ async def get_current_user(authorization: str = Header(None)):
 
     except HTTPException:
         raise
+    except jwt.InvalidTokenError as e:
+        print(f"DEBUG: Invalid token: {e}")
+        raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
     except Exception as e:
         print(f"DEBUG: Authentication exception: {e}")
         raise HTTPException(status_code=401, detail=f"Authentication failed: {str(e)}")
@@ -63,7 +96,22 @@ async def get_current_user(authorization: str = Header(None)):
 
 async def get_admin_user(user=Depends(get_current_user)):
     """Check if the user has admin role."""
-    profile = supabase_admin.table("profiles").select("role").eq("id", user.id).single().execute()
-    if not profile.data or profile.data.get("role") != "admin":
+    known = _profiles.get(user.id)
+    role = known.get("role") if known else None
+    if role is None:
+        profile = await db.execute(db.table("profiles").select("role").eq("id", user.id).single())
+        role = profile.data.get("role") if profile.data else None
+        if role:
+            _profiles.set(user.id, {"role": role})
+    if role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     return user
+
+
+def invalidate_profile(user_id: str):
+    """Forget the cached profile/role so the next request re-reads it."""
+    _profiles.pop(user_id)
+
+
+def profile_cache_stats() -> dict:
+    return _profiles.stats()
@@ -0,0 +1,112 @@
+"""
+In-process verification of Supabase access tokens.
+HS256 tokens are checked against the project JWT secret, asymmetric tokens
+(RS256/ES256) against the project's JWKS, which is cached and re-fetched when
+an unknown key id shows up (key rotation, at most once per cooldown period).
+"""
+import time
+import jwt
+from jwt import PyJWKClient
+from .cache import TTLCache
+from .config import settings
+
+ASYMMETRIC_ALGORITHMS = ("RS256", "ES256")
+
+# Already-verified tokens → TokenUser, never kept past the token's own expiry
+_verified = TTLCache(maxsize=settings.AUTH_TOKEN_CACHE_SIZE, ttl=settings.AUTH_TOKEN_CACHE_TTL)
+_jwks_client = None
+
+
+class TokenConfigError(Exception):
+    """Raised when the token cannot be checked locally (missing secret / JWKS)."""
+
+
+class TokenUser:
+    """Minimal stand-in for the Supabase ``User`` object, built from JWT claims."""
+
+    def __init__(self, claims: dict):
+        self.id = claims["sub"]
+        self.email = claims.get("email")
+        self.user_metadata = claims.get("user_metadata") or {}
+        self.app_metadata = claims.get("app_metadata") or {}
+        self.role = claims.get("role")
+        self.claims = claims
+
+
+def _get_jwks_client() -> PyJWKClient:
+    """Lazy JWKS client; PyJWKClient refreshes the key set itself on unknown ``kid``."""
+    global _jwks_client
+    if _jwks_client is None:
+        if not settings.SUPABASE_JWKS_URL.startswith("http"):
+            raise TokenConfigError("SUPABASE_JWKS_URL is not configured")
+        _jwks_client = PyJWKClient(
+            settings.SUPABASE_JWKS_URL,
+            cache_keys=True,
+            cache_jwk_set=True,
+            lifespan=settings.JWKS_CACHE_TTL,
+        )
+    return _jwks_client
+
+
+def _signing_key(token: str, alg: str):
+    if alg == "HS256":
+        if not settings.SUPABASE_JWT_SECRET:
+            raise TokenConfigError("SUPABASE_JWT_SECRET is not configured")
+        return settings.SUPABASE_JWT_SECRET
+    if alg in ASYMMETRIC_ALGORITHMS:
+        try:
+            return _get_jwks_client().get_signing_key_from_jwt(token).key
+        except jwt.PyJWKClientConnectionError as e:
+            raise TokenConfigError(f"JWKS unavailable: {e}")
+    raise jwt.InvalidAlgorithmError(f"Unsupported token algorithm: {alg}")
+
+
+def needs_jwks(token: str) -> bool:
+    """True when verifying ``token`` may fetch the JWKS over the network (blocking)."""
+    return jwt.get_unverified_header(token).get("alg", "") in ASYMMETRIC_ALGORITHMS
+
+
+def verify_token(token: str) -> TokenUser:
+    """Verify signature, expiry and audience of an access token.
+
+    Blocking for asymmetric tokens (JWKS fetch) - see ``needs_jwks``.
+    Raises ``jwt.InvalidTokenError`` for bad tokens and ``TokenConfigError``
+    when local verification is not possible.
+    """
+    alg = jwt.get_unverified_header(token).get("alg", "")
+    claims = jwt.decode(
+        token,
+        _signing_key(token, alg),
+        algorithms=[alg],
+        audience=settings.SUPABASE_JWT_AUDIENCE or None,
+        options={"require": ["exp", "sub"]},
+    )
+    user = TokenUser(claims)
+    remember(token, user, claims["exp"])
+    return user
+
+
+def unverified_expiry(token: str):
+    """Read ``exp`` without checking the signature (only used to bound cache lifetime)."""
+    try:
+        return jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.InvalidTokenError:
+        return None
+
+
+def remember(token: str, user, expires_at: float = None):
+    """Cache a verified user for at most the cache TTL and never past ``expires_at``."""
+    ttl = settings.AUTH_TOKEN_CACHE_TTL
+    if expires_at:
+        ttl = min(ttl, expires_at - time.time())
+    if ttl > 0:
+        _verified.set(token, user, ttl=ttl)
+
+
+def cached_user(token: str):
+    """Return the cached user for an already-verified token, if any."""
+    return _verified.get(token)
+
+
+def cache_stats() -> dict:
+    return _verified.stats()
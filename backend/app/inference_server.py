@@ -0,0 +1,88 @@
+# pyre-ignore-all-errors
+"""
+Inference sidecar — one process per node that owns the local models
+(BART-CNN, BART-MNLI, Argos) for every API worker.
+
+Run it next to the API (a single worker — the models are loaded once):
+    uvicorn app.inference_server:app --uds /tmp/policymitr-inference.sock --timeout-graceful-shutdown 60
+and start the API workers with INFERENCE_MODE=sidecar.
+
+Requests from all API workers share the cross-request batchers and the local
+inference pool. Each request is bounded by the caller's X-Request-Timeout
+(504 once it passes, and work still queued for it is skipped). /health
+reports "loading" until the models are in memory. On SIGTERM uvicorn stops
+accepting connections and lets in-flight requests finish; callers retry
+against the restarted process.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from .core.config import settings
+from .services import argos, local_inference, summarizer
+
+_state = {"status": "loading", "started_at": time.time(), "error": None}
+
+
+async def _load_models():
+    try:
+        await local_inference.run(summarizer.get_summarizer)
+        await local_inference.run(summarizer.get_classifier)
+        await local_inference.run(argos.load)
+        _state["status"] = "ready"
+        print("[Inference] Models loaded, ready")
+    except Exception as e:
+        _state.update(status="failed", error=str(e))
+        print(f"[Inference] Model load failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loader = asyncio.create_task(_load_models())
+    yield
+    loader.cancel()
+    local_inference.shutdown()
+
+
+app = FastAPI(title=f"{settings.PROJECT_NAME} inference", lifespan=lifespan)
+
+
+async def _within_deadline(request: Request, coro):
+    try:
+        timeout = float(request.headers.get("X-Request-Timeout", settings.INFERENCE_TIMEOUT))
+    except ValueError:
+        timeout = settings.INFERENCE_TIMEOUT
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Inference deadline exceeded")
+
+
+@app.get("/health")
+async def health():
+    return {
+        "status": _state["status"],
+        "error": _state["error"],
+        "pid": os.getpid(),
+        "uptime_s": round(time.time() - _state["started_at"]),
+        "backend": summarizer.backends,
+        "executor": local_inference.metrics(),
+    }
+
+
+@app.post("/analyze")
+async def analyze(data: dict, request: Request):
+    """Full local analysis (summarizer.analyze_policy)."""
+    if _state["status"] == "loading":
+        raise HTTPException(status_code=503, detail="Models loading")
+    return await _within_deadline(request, summarizer.analyze_policy(data.get("text", "")))
+
+
+@app.post("/translate")
+async def translate(data: dict, request: Request):
+    """Offline translation; ``translated`` is null when there is no model for the language."""
+    if data.get("target_language") != "hi":
+        return {"translated": None}
+    translated = await _within_deadline(request, local_inference.run(argos.translate_hi, data.get("text", "")))
+    return {"translated": translated}
@@ -2,15 +2,37 @@
 """
 PolicyMitr API — FastAPI entry point.
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from .core import db
 from .core.config import settings
 from .routers import auth, policies, ai, admin
+from .services import audit, inference_client, jobs, local_inference
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Own process-wide resources: the Supabase client, its connection pool, the audit writer,
+    the upload job workers and local inference (in-process pool or sidecar client)."""
+    db.startup()
+    await audit.writer.start()
+    await jobs.queue.start()
+    if settings.INFERENCE_MODE == "sidecar":
+        await inference_client.start()
+    yield
+    await jobs.queue.stop()
+    await audit.writer.stop()
+    await inference_client.stop()
+    local_inference.shutdown()
+    db.shutdown()
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
     description="PolicyMitr — AI-Powered Government Policy Assistant API",
+    lifespan=lifespan,
 )
 
 # CORS
@@ -36,4 +58,6 @@ async def health_check():
         "service": settings.PROJECT_NAME,
         "version": settings.VERSION,
         "gemini_configured": bool(settings.GEMINI_API_KEY),
+        "inference_mode": settings.INFERENCE_MODE,
+        "inference_sidecar": inference_client.health() if settings.INFERENCE_MODE == "sidecar" else None,
     }
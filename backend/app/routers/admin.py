@@ -2,8 +2,14 @@
 """
 Admin router - analytics, user management, activity logs.
 """
+import asyncio
 from fastapi import APIRouter, Depends
-from app.core.security import get_admin_user, supabase_admin
+from app.core import admission, db, tokens
+from app.core.security import get_admin_user, profile_cache_stats
+from app.services import audit, embeddings, gemini, inference_batcher, inference_client, jobs, local_inference, retrieval
+from app.services.answer_cache import cache as answer_cache
+from app.services.document_store import store as document_store
+from app.services.translation_cache import cache as translation_cache
 
 router = APIRouter(prefix="/api/admin", tags=["admin"]) # type: ignore
 
@@ -11,9 +17,13 @@ router = APIRouter(prefix="/api/admin", tags=["admin"]) # type: ignore
 @router.get("/analytics")
 async def get_analytics(user=Depends(get_admin_user)):
     """Get platform analytics."""
-    users = supabase_admin.table("profiles").select("id", count="exact").execute()
-    policies = supabase_admin.table("policies").select("id, category, language", count="exact").execute()
-    actions = supabase_admin.table("activity_logs").select("id", count="exact").execute()
+    # Independent queries - run them concurrently on the DB pool
+    users, policies, actions, translations = await asyncio.gather(
+        db.execute(db.table("profiles").select("id", count="exact")),
+        db.execute(db.table("policies").select("id, category, language", count="exact")),
+        db.execute(db.table("activity_logs").select("id", count="exact")),
+        db.execute(db.table("activity_logs").select("details").eq("action_type", "translated")),
+    )
 
     # Category breakdown (from policies)
     categories = {}
@@ -24,7 +34,6 @@ async def get_analytics(user=Depends(get_admin_user)):
 
     # Language breakdown (from translation activity)
     languages = {}
-    translations = supabase_admin.table("activity_logs").select("details").eq("action_type", "translated").execute()
     if translations.data:
         for t in translations.data:
             details = t.get("details") or {}
@@ -44,16 +53,49 @@ async def get_analytics(user=Depends(get_admin_user)):
 @router.get("/users")
 async def get_users(user=Depends(get_admin_user)):
     """List all users."""
-    result = supabase_admin.table("profiles").select("*").order("created_at", desc=True).execute()
+    result = await db.execute(db.table("profiles").select("*").order("created_at", desc=True))
     return result.data or []
 
 
 @router.get("/activity")
 async def get_activity(user=Depends(get_admin_user)):
     """Get recent activity."""
-    result = supabase_admin.table("activity_logs") \
-        .select("*") \
-        .order("created_at", desc=True) \
-        .limit(50) \
-        .execute()
+    result = await db.execute(
+        db.table("activity_logs")
+        .select("*")
+        .order("created_at", desc=True)
+        .limit(50)
+    )
     return result.data or []
+
+
+@router.get("/metrics")
+async def get_metrics(user=Depends(get_admin_user)):
+    """Process-local performance counters (per API worker)."""
+    return {
+        "db_pool": db.pool_stats(),
+        "audit_writer": audit.writer.metrics(),
+        "upload_jobs": jobs.queue.metrics(),
+        "admission": admission.metrics(),
+        "local_inference": {
+            "executor": local_inference.metrics(),
+            "batchers": inference_batcher.metrics(),
+            "sidecar": inference_client.metrics(),
+        },
+        "llm": gemini.metrics(),
+        "embeddings": embeddings.metrics(),
+        "translation_cache": translation_cache.metrics(),
+        "retrieval_index": retrieval.metrics(),
+        "answer_cache": answer_cache.metrics(),
+        "document_store": document_store.metrics(),
+        "auth": {
+            "token_cache": tokens.cache_stats(),
+            "profile_cache": profile_cache_stats(),
+        },
+    }
+
+
+@router.get("/diagnostics/llm")
+async def get_llm_diagnostics(user=Depends(get_admin_user)):
+    """Model router state: circuits, recent error rates/latency and quota headroom."""
+    return gemini.router_state()
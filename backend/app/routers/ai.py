@@ -2,10 +2,15 @@
 """
 AI router - chatbot, translation, TTS, recommendations.
 """
-import uuid
+import asyncio
+import json
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
-from app.core.security import get_current_user, supabase_admin
+from app.core import admission, db
+from app.core.config import settings
+from app.core.security import get_current_user
+from app.services import audit, embeddings
+from app.services.answer_cache import cache as answer_cache
 from app.services import llm as llm_service
 from app.services import tts as tts_service
 
@@ -15,109 +20,264 @@ with open("bug_log.txt", "a") as f:
     f.write("DEBUG: AI ROUTER IMPORTED\n")
 
 
-@router.post("/chat")
-async def chat(data: dict, user=Depends(get_current_user)):
-    """RAG-based chatbot endpoint."""
-    query = data.get("query", "")
-    policy_id = data.get("policy_id")
-    
-    # Create local client to verify if supabase_admin is broken
-    from supabase import create_client
-    from app.core.config import settings
-    local_supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
-    
-    if not query:
-        raise HTTPException(status_code=400, detail="Query is required")
+def _clause_chunk(c: dict) -> str:
+    # defensivley get columns
+    text = c.get('clause_text') or c.get('text') or ''
+    expl = c.get('explanation') or ''
+    return f"{text}\nExplanation: {expl}" if text else ""
+
+
+async def _relevant_clauses(policy_id, vector) -> list:
+    """Top-k clauses of the policy by vector similarity (match_clauses).
+
+    Returns [] when nothing clears RAG_MATCH_THRESHOLD (an off-topic
+    question), and None - fall back to every clause - when the query has
+    no embedding, the lookup fails, or the policy has no clause embeddings
+    (uploaded before they were computed).
+    """
+    if vector is None:
+        return None
+    try:
+        matches = await db.execute(db.rpc("match_clauses", {
+            "query_embedding": vector,
+            "match_threshold": settings.RAG_MATCH_THRESHOLD,
+            "match_count": settings.RAG_TOP_K,
+            "p_policy_id": policy_id,
+        }))
+    except Exception as e:
+        print(f"DEBUG: match_clauses FAILED: {e}")
+        return None
+    if matches.data:
+        return matches.data
+    return [] if await _has_embeddings(policy_id) else None
+
+
+async def _has_embeddings(policy_id) -> bool:
+    try:
+        embedded = await db.execute(
+            db.table("clauses")
+            .select("id")
+            .eq("policy_id", policy_id)
+            .not_.is_("embedding", "null")
+            .limit(1)
+        )
+    except Exception as e:
+        print(f"DEBUG: Embedding check FAILED: {e}")
+        return False
+    return bool(embedded.data)
+
 
-    # Get policy context
-    context_chunks = []
-    if policy_id:
+async def _all_clauses(policy_id) -> list:
+    clauses = await db.execute(
+        db.table("clauses")
+        .select("clause_text, explanation")
+        .eq("policy_id", policy_id)
+        .order("clause_number")
+    )
+    return clauses.data or []
+
+
+async def _policy_summary(policy_id):
+    policy = await db.execute(
+        db.table("policies")
+        .select("summary")
+        .eq("id", policy_id)
+        .single()
+    )
+    return (policy.data or {}).get("summary", "")
+
+
+async def _policy_context(policy_id, vector) -> list:
+    """Policy summary + the clauses closest to the query ``vector`` as prompt context chunks."""
+    if not policy_id:
+        return []
+    summary, clauses = await asyncio.gather(
+        _policy_summary(policy_id),
+        _relevant_clauses(policy_id, vector),
+        return_exceptions=True,
+    )
+    if isinstance(summary, Exception):
+        print(f"DEBUG: Policy query FAILED: {summary}")
+        summary = None
+    if not isinstance(clauses, list):
+        # No vectors for this policy/query - fall back to every clause (packed later)
         try:
-            # Use select * to be safe against column renaming issues
-            clauses = local_supabase.table("clauses") \
-                .select("*") \
-                .eq("policy_id", policy_id) \
-                .execute()
-            
-            if clauses.data:
-                for c in clauses.data:
-                    # defensivley get columns
-                    text = c.get('clause_text') or c.get('text') or ''
-                    expl = c.get('explanation') or ''
-                    if text:
-                        context_chunks.append(f"{text}\nExplanation: {expl}")
+            clauses = await _all_clauses(policy_id)
         except Exception as e:
             print(f"DEBUG: Clauses query FAILED: {e}")
+            clauses = []
 
-        # Also get policy summary
-        try:
-            policy = supabase_admin.table("policies") \
-                .select("*") \
-                .eq("id", policy_id) \
-                .single() \
-                .execute()
-
-            if policy.data:
-                context_chunks.insert(0, f"Policy Summary: {policy.data.get('summary', '')}") # type: ignore
-        except Exception as e:
-            print(f"DEBUG: Policy query FAILED: {e}")
+    context_chunks = [chunk for chunk in (_clause_chunk(c) for c in clauses) if chunk]
+    if summary is not None:
+        context_chunks.insert(0, f"Policy Summary: {summary}")
+    return context_chunks
 
-    # Get chat history
+
+async def _chat_history(user_id: str) -> list:
+    """Last 10 chat messages of the user, oldest first."""
     chat_history = []
     try:
-        history = supabase_admin.table("chat_history") \
-            .select("*") \
-            .eq("user_id", user.id) \
-            .order("created_at", desc=True) \
-            .limit(10) \
-            .execute()
-        
+        history = await db.execute(
+            db.table("chat_history")
+            .select("role, message")
+            .eq("user_id", user_id)
+            .order("created_at", desc=True)
+            .limit(10)
+        )
+
         if history.data:
             # Reverse to chronological order
             raw_history = list(reversed(history.data))
             for h in raw_history:
                 role = h.get('role', 'user') # type: ignore
-                content = h.get('content', '') # type: ignore
+                content = h.get('message', '') # type: ignore
                 chat_history.append({"role": role, "content": content})
     except Exception as e:
         print(f"DEBUG: History query FAILED: {e}")
+    return chat_history
 
-    # Generate answer
-    answer = await llm_service.chat_with_context(query, context_chunks, chat_history)
 
-    # Save chat messages (non-critical)
-    try:
-        supabase_admin.table("chat_history").insert({
-            "id": str(uuid.uuid4()),
-            "user_id": user.id,
-            "policy_id": policy_id,
-            "role": "user",
-            "content": query,
-        }).execute()
-
-        supabase_admin.table("chat_history").insert({
-            "id": str(uuid.uuid4()),
-            "user_id": user.id,
-            "policy_id": policy_id,
-            "role": "assistant",
-            "content": answer,
-        }).execute()
-    except Exception as e:
-        # Schema issue (missing 'content' column) causes 500 in logs, but chat works.
-        print(f"DEBUG: Chat save FAILED (Non-fatal): {e}")
+def _chat_query(data: dict):
+    query = data.get("query", "")
+    policy_id = data.get("policy_id")
+
+    if not query:
+        raise HTTPException(status_code=400, detail="Query is required")
+    return query, policy_id
+
 
-    # Log activity (non-critical)
+async def _chat_inputs(query: str, policy_id, vector, user):
+    # Policy context and history are independent - fetch them concurrently
+    context_chunks, chat_history = await asyncio.gather(
+        _policy_context(policy_id, vector),
+        _chat_history(user.id),
+    )
+    return context_chunks, chat_history
+
+
+async def _query_vector(query: str, policy_id):
+    """Query embedding, shared by the answer cache and clause retrieval."""
+    return await embeddings.embed_query(query) if policy_id else None
+
+
+def _cacheable(answer: str) -> bool:
+    return bool(answer) and not answer.startswith(("Gemini Error", "*(AI Offline Mode)*"))
+
+
+def _save_chat(user, policy_id, query: str, answer: str):
+    # Save chat messages + log activity (non-critical, written in the background)
+    audit.save_chat_message(user.id, policy_id, "user", query)
+    audit.save_chat_message(user.id, policy_id, "assistant", answer)
+    audit.log_activity(user.id, "chatbot_used", {"query": query[:100]}, policy_id)
+
+
+@router.post("/chat")
+async def chat(data: dict, user=Depends(get_current_user)):
+    """RAG-based chatbot endpoint."""
+    query, policy_id = _chat_query(data)
+    vector = await _query_vector(query, policy_id)
+
+    # Near-identical question already answered for this policy
+    cached = answer_cache.get(policy_id, vector)
+    if cached is not None:
+        _save_chat(user, policy_id, query, cached)
+        return {"answer": cached, "cached": True}
+
+    # Fails fast with 429/503 when the LLM tier is saturated
+    async with admission.llm.admit():
+        context_chunks, chat_history = await _chat_inputs(query, policy_id, vector, user)
+
+        # Generate answer
+        answer = await llm_service.chat_with_context(query, context_chunks, chat_history, policy_id)
+    _save_chat(user, policy_id, query, answer)
+    if _cacheable(answer):
+        answer_cache.put(policy_id, vector, query, answer)
+
+    return {"answer": answer, "cached": False}
+
+
+class _AdmittedStream(StreamingResponse):
+    """StreamingResponse that releases its admission slot however the response ends -
+    including when the client is gone before the body iterator ever starts."""
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
+
+
+def _sse(payload: dict) -> str:
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(data: dict, user=Depends(get_current_user)):
+    """Streaming variant of /chat (Server-Sent Events).
+
+    Emits ``{"token": ...}`` events as the answer is generated, then
+    ``{"done": true, "answer": ..., "cached": ...}`` - or ``{"error": ...}`` if generation
+    fails partway. The assembled answer is saved afterwards.
+    """
+    query, policy_id = _chat_query(data)
+    vector = await _query_vector(query, policy_id)
+    cached = answer_cache.get(policy_id, vector)
+
+    if cached is not None:
+        async def cached_events():
+            yield _sse({"token": cached})
+            yield _sse({"done": True, "answer": cached, "cached": True})
+            _save_chat(user, policy_id, query, cached)
+
+        return StreamingResponse(
+            cached_events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    # Admitted before the response starts, so saturation is still a proper 429/503;
+    # the slot is held until the stream ends
+    release = admission.llm.releaser(await admission.llm.acquire())
     try:
-        supabase_admin.table("activity_logs").insert({
-            "id": str(uuid.uuid4()),
-            "user_id": user.id,
-            "action_type": "chat",
-            "details": query[:100],
-        }).execute()
-    except Exception:
-        pass
+        context_chunks, chat_history = await _chat_inputs(query, policy_id, vector, user)
+    except BaseException:
+        release()
+        raise
 
-    return {"answer": answer}
+    async def events():
+        pieces = []
+        try:
+            try:
+                async for piece in llm_service.chat_with_context_stream(query, context_chunks, chat_history, policy_id):
+                    pieces.append(piece)
+                    yield _sse({"token": piece})
+            except Exception as e:
+                # A broken stream is reported, never cached - even if it produced some text first
+                print(f"DEBUG: Chat stream FAILED: {e}")
+                yield _sse({"error": f"Gemini Error: {e}"})
+                return
+            answer = "".join(pieces).strip()
+            yield _sse({"done": True, "answer": answer, "cached": False})
+            # Only complete answers are cached
+            if _cacheable(answer):
+                answer_cache.put(policy_id, vector, query, answer)
+        finally:
+            release()
+            # Also persist partial answers when the client disconnects mid-stream
+            answer = "".join(pieces).strip()
+            if answer:
+                _save_chat(user, policy_id, query, answer)
+
+    return _AdmittedStream(
+        events(),
+        release,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.post("/translate")
@@ -131,16 +291,8 @@ async def translate(data: dict, user=Depends(get_current_user)):
 
     translated = await llm_service.translate_text(text, target_language)
 
-    # Log activity (non-critical)
-    try:
-        supabase_admin.table("activity_logs").insert({
-            "id": str(uuid.uuid4()),
-            "user_id": user.id,
-            "action_type": "translated",
-            "details": {"target_language": target_language},
-        }).execute()
-    except Exception as e:
-        print(f"DEBUG: Translate log FAILED (Non-fatal): {e}")
+    # Log activity (non-critical, written in the background)
+    audit.log_activity(user.id, "translated", {"target_language": target_language})
 
     return {"translated_text": translated}
 
@@ -154,18 +306,20 @@ async def text_to_speech(data: dict, user=Depends(get_current_user)):
     if not text:
         raise HTTPException(status_code=400, detail="Text is required")
 
-    audio_stream = await tts_service.generate_speech(text, language)
+    async with admission.tts.admit():
+        audio_stream = await tts_service.generate_speech(text, language)
     return StreamingResponse(audio_stream, media_type="audio/mpeg")
 
 
 @router.get("/recommendations/{policy_id}")
 async def recommendations(policy_id: str, user=Depends(get_current_user)):
     """Get recommendations based on a policy."""
-    policy = supabase_admin.table("policies") \
-        .select("original_text") \
-        .eq("id", policy_id) \
-        .single() \
-        .execute()
+    policy = await db.execute(
+        db.table("policies")
+        .select("original_text")
+        .eq("id", policy_id)
+        .single()
+    )
 
     if not policy.data:
         raise HTTPException(status_code=404, detail="Policy not found")
@@ -3,7 +3,8 @@
 Auth router - profile management.
 """
 from fastapi import APIRouter, Depends, HTTPException
-from app.core.security import get_current_user, supabase_admin # type: ignore
+from app.core import db
+from app.core.security import get_current_user, invalidate_profile # type: ignore
 
 router = APIRouter(prefix="/api/auth", tags=["auth"]) # type: ignore
 
@@ -11,11 +12,12 @@ router = APIRouter(prefix="/api/auth", tags=["auth"]) # type: ignore
 @router.get("/profile")
 async def get_profile(user=Depends(get_current_user)):
     """Get current user's profile."""
-    result = supabase_admin.table("profiles") \
-        .select("*") \
-        .eq("id", user.id) \
-        .single() \
-        .execute()
+    result = await db.execute(
+        db.table("profiles")
+        .select("*")
+        .eq("id", user.id)
+        .single()
+    )
 
     if not result.data:
         # Auto-create profile if missing
@@ -25,7 +27,7 @@ async def get_profile(user=Depends(get_current_user)):
             "full_name": user.user_metadata.get("full_name", "") if user.user_metadata else "", # type: ignore
             "role": "user",
         }
-        insert_result = supabase_admin.table("profiles").insert(profile_data).execute()
+        insert_result = await db.execute(db.table("profiles").insert(profile_data))
         return insert_result.data[0] if insert_result.data else profile_data # type: ignore
 
     return result.data
@@ -37,9 +39,11 @@ async def update_profile(data: dict, user=Depends(get_current_user)):
     allowed_fields = ["full_name", "avatar_url", "preferred_language"]
     update_data = {k: v for k, v in data.items() if k in allowed_fields}
 
-    result = supabase_admin.table("profiles") \
-        .update(update_data) \
-        .eq("id", user.id) \
-        .execute()
+    result = await db.execute(
+        db.table("profiles")
+        .update(update_data)
+        .eq("id", user.id)
+    )
+    invalidate_profile(user.id)
 
     return result.data[0] if result.data else {"message": "Updated"} # type: ignore
@@ -3,98 +3,203 @@
 Policy CRUD and processing router.
 Uses BART for summarization + classification, Gemini for translation.
 """
+import asyncio
+import json
+import time
 import uuid
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form
-from app.core.security import get_current_user, supabase_admin
+from fastapi.responses import StreamingResponse
+from app.core import admission, db
+from app.core.config import settings
+from app.core.security import get_current_user
+from app.services import embeddings, jobs, retrieval
 from app.services import pdf as pdf_service
-from app.services import summarizer
+from app.services.answer_cache import cache as answer_cache
+from app.services.document_store import file_key, store as document_store
 from app.services import llm as llm_service
 
 router = APIRouter(prefix="/api/policies", tags=["policies"])
 
 
-@router.post("/upload")
+def _as_int(value, default: int) -> int:
+    """Coerce LLM-produced numbers ("3", 3.0) to int for integer columns."""
+    try:
+        return int(round(float(value)))
+    except (TypeError, ValueError):
+        return default
+
+
+async def _analyze(text: str) -> dict:
+    """Analysis with normalized clauses and their embeddings - the unit stored in document_store."""
+    # AI analysis using Gemini (Fast) or fallback to BART
+    analysis = await llm_service.analyze_policy_gemini(text)
+
+    clauses = [
+        {
+            "clause_number": _as_int(clause.get("clause_number"), i + 1),
+            "clause_text": clause.get("clause_text", "") or "",
+            "explanation": clause.get("explanation", "") or "",
+        }
+        for i, clause in enumerate(analysis.get("clauses", []) or [])
+        if isinstance(clause, dict)
+    ]
+    # Clause embeddings for vector retrieval in chat (batched; skipped if unavailable)
+    vectors = await embeddings.embed_texts([embeddings.clause_text(c) for c in clauses])
+    if vectors:
+        for clause, vector in zip(clauses, vectors):
+            clause["embedding"] = vector
+    # Missing embeddings (when they could have been computed) make it an incomplete result
+    degraded = bool(analysis.get("degraded")) or bool(clauses and not vectors and embeddings.enabled())
+    return {**analysis, "clauses": clauses, "degraded": degraded}
+
+
+@router.post("/upload", status_code=202)
 async def upload_policy(
     file: UploadFile = File(...),
     title: str = Form(""),
     language: str = Form("en"),
     privacy_mode: str = Form("false"),
+    force_reanalyze: str = Form("false"),
     user=Depends(get_current_user),
 ):
     print(f"DEBUG UPLOAD: title={title}, language={language}, privacy_mode={privacy_mode}")
-    """Upload and process a policy document using BART models."""
-    # 1. Read file bytes
+    """Queue a policy document for processing.
+    Returns a job id; follow it with GET /jobs/{job_id} or the SSE stream /jobs/{job_id}/events.
+    """
+    # Backpressure: refuse before reading the file into memory when the job backlog is full
+    if jobs.queue.queued() >= settings.JOB_QUEUE_LIMIT:
+        jobs.queue.stats["rejected"] += 1
+        raise HTTPException(
+            status_code=429,
+            detail="Too many documents are waiting to be processed. Please retry shortly.",
+            headers={"Retry-After": str(jobs.queue.retry_after())},
+        )
     file_bytes = await file.read()
-    content_type = file.content_type or ""
-
-    # 2. Extract text
-    text = pdf_service.extract_text(file_bytes, content_type)
-    if not text or len(text.strip()) < 20:
-        raise HTTPException(status_code=400, detail="Could not extract text from the file. Try a different PDF or image.")
-
-    # 3. AI analysis using Gemini (Fast) or fallback to BART
-    analysis = await llm_service.analyze_policy_gemini(text)
+    if not file_bytes:
+        raise HTTPException(status_code=400, detail="Empty file")
+    job_id = await jobs.queue.submit("policy_upload", user.id, {
+        "filename": file.filename or "",
+        "content_type": file.content_type or "",
+        "title": title,
+        "language": language,
+        "privacy_mode": privacy_mode,
+        "force_reanalyze": force_reanalyze,
+    }, file_bytes)
+    return {"job_id": job_id, "status": jobs.QUEUED}
+
+
+async def _process_upload(job: dict, report) -> dict:
+    """Upload job: extract → analyze → persist. Returns the saved policy with its clauses.
+    A document seen before (same file bytes or same extracted text) reuses its stored analysis
+    unless force_reanalyze is set.
+    """
+    start = time.time()
+    params = job["params"]
+    title, language, privacy_mode = params["title"], params["language"], params["privacy_mode"]
+    force = params["force_reanalyze"].lower() == "true"
+
+    # 1. Read the spooled file
+    file_bytes = await asyncio.to_thread(jobs.queue.read_file, job)
+    content_type = params["content_type"]
+    file_hash = file_key(file_bytes)
+
+    # 2. Same file uploaded before - skip extraction and analysis
+    stored = None if force else await document_store.get_by_file(file_hash)
+    reused = stored is not None
+    if reused:
+        text, analysis = stored
+    else:
+        # 3. Extract text (PDF parsing / OCR is CPU bound - keep it off the event loop)
+        await report("extracting", 10)
+        async with admission.ocr.admit(background=True):
+            text = await asyncio.to_thread(pdf_service.extract_text, file_bytes, content_type)
+        if not text or len(text.strip()) < 20:
+            raise HTTPException(status_code=400, detail="Could not extract text from the file. Try a different PDF or image.")
+
+        # 4. Same text from a different file, else full analysis
+        analysis = None if force else await document_store.get_by_text(file_hash, text)
+        reused = analysis is not None
+        if not reused:
+            await report("analyzing", 30)
+            analysis = await _analyze(text)
+            # Only complete analyses are reused - a transient Gemini/embedding failure
+            # must not be locked in for every later upload of the same content
+            if privacy_mode.lower() != "true" and not analysis["degraded"]:
+                await document_store.put(file_hash, text, analysis)
+    if reused:
+        print(f"[Upload] Reusing stored analysis for {file_hash[:12]}")
+        analysis = {**analysis, "processing_time": round(time.time() - start, 2)}
 
     # Hindi translation skipped for speed — available on-demand via PolicyViewer
 
-    # 5. Save policy to Supabase
+    # 5. Build the policy row
     policy_id = str(uuid.uuid4())
-    policy_title = title if title else (file.filename or "Untitled Policy")
+    policy_title = title if title else (params["filename"] or "Untitled Policy")
 
     policy_data = {
         "id": policy_id,
-        "user_id": user.id,
+        "user_id": job["user_id"],
         "title": policy_title,
-        "original_text": text[:50000],
+        "original_text": text,
         "summary": analysis.get("summary", ""),
         "simplified": analysis.get("simplified", ""),
         "hindi_summary": analysis.get("hindi_summary", ""),
         "category": analysis.get("category", "Other"),
-        "difficulty_score": analysis.get("difficulty_score", 50),
+        "difficulty_score": _as_int(analysis.get("difficulty_score"), 50),
         "ai_confidence": analysis.get("ai_confidence", 0.5),
         "processing_time": analysis.get("processing_time", 0),
         "language": language,
     }
 
-    result = supabase_admin.table("policies").insert(policy_data).execute()
+    # 6. Save policy + clauses + activity log atomically in one round trip
+    await report("saving", 90)
+    try:
+        result = await db.execute(db.rpc("create_policy_with_clauses", {
+            "p_policy": policy_data,
+            "p_clauses": analysis["clauses"],
+            "p_activity": {"action_type": "uploaded", "details": {"title": policy_title, "deduplicated": reused}},
+        }))
+    except Exception as e:
+        print(f"DEBUG: Policy save FAILED: {e}")
+        raise HTTPException(status_code=500, detail="Failed to save policy")
     if not result.data:
         raise HTTPException(status_code=500, detail="Failed to save policy")
 
-    # 6. Save clauses
-    clauses = analysis.get("clauses", [])
-    saved_clauses = []
-    for clause in clauses:
-        clause_data = {
-            "id": str(uuid.uuid4()),
-            "policy_id": policy_id,
-            "clause_number": clause.get("clause_number", 0),
-            "clause_text": clause.get("clause_text", ""),
-            "explanation": clause.get("explanation", ""),
-        }
-        try:
-            clause_result = supabase_admin.table("clauses").insert(clause_data).execute()
-            if clause_result.data:
-                saved_clauses.append(clause_result.data[0])
-        except Exception:
-            pass
+    # 7. Return full result (policy row with its saved clauses)
+    return {**result.data, "deduplicated": reused}
+
+
+jobs.queue.register("policy_upload", _process_upload)
 
-    # 7. Log activity (non-critical)
-    try:
-        supabase_admin.table("activity_logs").insert({
-            "id": str(uuid.uuid4()),
-            "user_id": user.id,
-            "action_type": "upload",
-            "details": f"Uploaded: {policy_title}",
-        }).execute()
-    except Exception:
-        pass
 
-    # 8. Return full result
-    policy_out = result.data[0]
-    policy_out["clauses"] = saved_clauses
+async def _owned_job(job_id: str, user) -> dict:
+    job = await jobs.queue.get(job_id)
+    if not job or job["user_id"] != user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
-    return policy_out
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, user=Depends(get_current_user)):
+    """Status, stage and progress of an upload job; ``result`` holds the policy once it succeeded."""
+    return jobs.queue.public(await _owned_job(job_id, user))
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, user=Depends(get_current_user)):
+    """Server-Sent Events stream of job updates, ending when the job succeeds or fails."""
+    await _owned_job(job_id, user)
+
+    async def events():
+        async for job in jobs.queue.watch(job_id):
+            yield f"data: {json.dumps(jobs.queue.public(job), ensure_ascii=False, default=str)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/")
@@ -104,17 +209,18 @@ async def list_policies(user=Depends(get_current_user)):
     try:
         # Try full query first
         # Try full query first
-        result = supabase_admin.table("policies") \
-            .select("id, title, category, summary, created_at, difficulty_score, ai_confidence, processing_time") \
-            .eq("user_id", user.id) \
-            .order("created_at", desc=True) \
-            .execute()
+        result = await db.execute(
+            db.table("policies")
+            .select("id, title, category, summary, created_at, difficulty_score, ai_confidence, processing_time")
+            .eq("user_id", user.id)
+            .order("created_at", desc=True)
+        )
         
         policies = result.data or []
 
         # Fetch bookmarks for this user
         try:
-            bookmarks_res = supabase_admin.table("bookmarks").select("policy_id").eq("user_id", user.id).execute()
+            bookmarks_res = await db.execute(db.table("bookmarks").select("policy_id").eq("user_id", user.id))
             bookmarked_ids = {b["policy_id"] for b in (bookmarks_res.data or [])}
             
             # Merge
@@ -131,11 +237,12 @@ async def list_policies(user=Depends(get_current_user)):
         print(f"DEBUG: List policies FAILED: {e}")
         # Try backup query with absolute minimum columns
         try:
-            result = supabase_admin.table("policies") \
-                .select("id, title, created_at") \
-                .eq("user_id", user.id) \
-                .order("created_at", desc=True) \
-                .execute()
+            result = await db.execute(
+                db.table("policies")
+                .select("id, title, created_at")
+                .eq("user_id", user.id)
+                .order("created_at", desc=True)
+            )
             return result.data or []
         except Exception as e2:
              print(f"DEBUG: Backup query also FAILED: {e2}")
@@ -145,32 +252,35 @@ async def list_policies(user=Depends(get_current_user)):
 @router.get("/{policy_id}")
 async def get_policy(policy_id: str, user=Depends(get_current_user)):
     """Get a specific policy with its clauses."""
-    policy = supabase_admin.table("policies") \
-        .select("*") \
-        .eq("id", policy_id) \
-        .eq("user_id", user.id) \
-        .single() \
-        .execute()
+    policy = await db.execute(
+        db.table("policies")
+        .select("*")
+        .eq("id", policy_id)
+        .eq("user_id", user.id)
+        .single()
+    )
 
     if not policy.data:
         raise HTTPException(status_code=404, detail="Policy not found")
 
-    clauses = supabase_admin.table("clauses") \
-        .select("*") \
-        .eq("policy_id", policy_id) \
-        .order("clause_number") \
-        .execute()
+    clauses = await db.execute(
+        db.table("clauses")
+        .select("*")
+        .eq("policy_id", policy_id)
+        .order("clause_number")
+    )
 
     result = policy.data
     result["clauses"] = clauses.data or [] # type: ignore
 
     # Check bookmark status
     try:
-        bookmark_res = supabase_admin.table("bookmarks") \
-            .select("id") \
-            .eq("user_id", user.id) \
-            .eq("policy_id", policy_id) \
-            .execute()
+        bookmark_res = await db.execute(
+            db.table("bookmarks")
+            .select("id")
+            .eq("user_id", user.id)
+            .eq("policy_id", policy_id)
+        )
         result["is_bookmarked"] = len(bookmark_res.data) > 0 if bookmark_res.data else False # type: ignore
     except Exception:
         result["is_bookmarked"] = False # type: ignore
@@ -182,30 +292,33 @@ async def get_policy(policy_id: str, user=Depends(get_current_user)):
 async def toggle_bookmark(policy_id: str, user=Depends(get_current_user)):
     """Toggle bookmark status on a policy."""
     # Check if header exists in bookmarks table
-    existing = supabase_admin.table("bookmarks") \
-        .select("id") \
-        .eq("user_id", user.id) \
-        .eq("policy_id", policy_id) \
-        .execute()
+    existing = await db.execute(
+        db.table("bookmarks")
+        .select("id")
+        .eq("user_id", user.id)
+        .eq("policy_id", policy_id)
+    )
 
     if existing.data and len(existing.data) > 0:
         # Delete (Unbookmark)
-        supabase_admin.table("bookmarks") \
-            .delete() \
-            .eq("user_id", user.id) \
-            .eq("policy_id", policy_id) \
-            .execute()
+        await db.execute(
+            db.table("bookmarks")
+            .delete()
+            .eq("user_id", user.id)
+            .eq("policy_id", policy_id)
+        )
         new_state = False
     else:
         # Insert (Bookmark)
-        supabase_admin.table("bookmarks") \
+        await db.execute(
+            db.table("bookmarks")
             .insert({
                 "id": str(uuid.uuid4()),
                 "user_id": user.id,
                 "policy_id": policy_id,
                 "created_at": datetime.now().isoformat()
-            }) \
-            .execute()
+            })
+        )
         new_state = True
 
     return {"is_bookmarked": new_state, "policy_id": policy_id}
@@ -214,8 +327,10 @@ async def toggle_bookmark(policy_id: str, user=Depends(get_current_user)):
 @router.delete("/{policy_id}")
 async def delete_policy(policy_id: str, user=Depends(get_current_user)):
     """Delete a policy."""
-    supabase_admin.table("clauses").delete().eq("policy_id", policy_id).execute()
-    result = supabase_admin.table("policies").delete().eq("id", policy_id).eq("user_id", user.id).execute()
+    await db.execute(db.table("clauses").delete().eq("policy_id", policy_id))
+    result = await db.execute(db.table("policies").delete().eq("id", policy_id).eq("user_id", user.id))
+    retrieval.invalidate(policy_id)
+    answer_cache.invalidate(policy_id)
     return {"message": "Deleted", "id": policy_id}
 
 
@@ -225,14 +340,17 @@ async def compare_policies_endpoint(
     user=Depends(get_current_user),
 ):
     """Compare two policies."""
-    policy_a = supabase_admin.table("policies").select("original_text, title").eq("id", data["policy_id_a"]).single().execute()
-    policy_b = supabase_admin.table("policies").select("original_text, title").eq("id", data["policy_id_b"]).single().execute()
+    policy_a, policy_b = await asyncio.gather(
+        db.execute(db.table("policies").select("original_text, title").eq("id", data["policy_id_a"]).single()),
+        db.execute(db.table("policies").select("original_text, title").eq("id", data["policy_id_b"]).single()),
+    )
 
     if not policy_a.data or not policy_b.data:
         raise HTTPException(status_code=404, detail="One or both policies not found")
 
-    result = await llm_service.compare_policies(
-        policy_a.data["original_text"][:3000],
-        policy_b.data["original_text"][:3000],
-    )
+    async with admission.llm.admit():
+        result = await llm_service.compare_policies(
+            policy_a.data["original_text"][:3000],
+            policy_b.data["original_text"][:3000],
+        )
     return result
@@ -0,0 +1,105 @@
+"""
+Answer cache - semantic cache of chat answers, per policy.
+A question is matched against earlier questions on the same policy by cosine
+similarity of their embeddings; above ANSWER_CACHE_THRESHOLD the stored
+answer is served without calling Gemini. Entries expire after
+ANSWER_CACHE_TTL, and a policy's entries are dropped when its clauses change
+(re-upload / delete).
+"""
+import time
+import numpy as np
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+
+def _normalize(vector) -> np.ndarray:
+    unit = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(unit))
+    return unit / norm if norm else unit
+
+
+class _PolicyAnswers:
+    """Answers of one policy, oldest first: one row of unit query vectors per entry
+    (so a lookup is a single matrix-vector product) plus the query, answer and expiry."""
+
+    def __init__(self):
+        self.vectors = None
+        self.entries = []
+
+    def best(self, unit: np.ndarray):
+        self._expire()
+        if not self.entries:
+            return None, -1.0
+        scores = self.vectors @ unit
+        i = int(np.argmax(scores))
+        return self.entries[i], float(scores[i])
+
+    def add(self, unit: np.ndarray, query: str, answer: str, expires_at: float, limit: int):
+        row = unit[np.newaxis, :]
+        self.vectors = row if self.vectors is None else np.vstack([self.vectors, row])[-limit:]
+        self.entries.append((query, answer, expires_at))
+        del self.entries[:-limit]
+
+    def _expire(self):
+        now = time.monotonic()
+        # Entries are appended in expiry order, so the expired ones are a prefix
+        expired = 0
+        while expired < len(self.entries) and self.entries[expired][2] <= now:
+            expired += 1
+        if expired:
+            del self.entries[:expired]
+            self.vectors = self.vectors[expired:]
+
+
+class AnswerCache:
+    def __init__(self, threshold: float, ttl: float, max_policies: int, max_per_policy: int):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_per_policy = max_per_policy
+        self._policies = TTLCache(maxsize=max_policies, ttl=None)
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    def get(self, policy_id, vector):
+        """Cached answer for a question similar enough to this one, else None."""
+        if not policy_id or vector is None:
+            return None
+        answers = self._policies.get(policy_id)
+        if answers is not None:
+            entry, score = answers.best(_normalize(vector))
+            if entry is not None and score >= self.threshold:
+                self.stats["hits"] += 1
+                print(f"[AnswerCache] Hit for policy {policy_id} (similarity {score:.3f})")
+                return entry[1]
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, policy_id, vector, query: str, answer: str):
+        if not policy_id or vector is None or not answer:
+            return
+        answers = self._policies.get(policy_id)
+        if answers is None:
+            answers = _PolicyAnswers()
+            self._policies.set(policy_id, answers)
+        answers.add(_normalize(vector), query, answer, time.monotonic() + self.ttl, self.max_per_policy)
+        self.stats["stores"] += 1
+
+    def invalidate(self, policy_id):
+        if self._policies.pop(policy_id) is not None:
+            self.stats["invalidations"] += 1
+
+    def metrics(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            "policies": len(self._policies),
+            "threshold": self.threshold,
+        }
+
+
+cache = AnswerCache(
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+    ttl=settings.ANSWER_CACHE_TTL,
+    max_policies=settings.ANSWER_CACHE_MAX_POLICIES,
+    max_per_policy=settings.ANSWER_CACHE_MAX_PER_POLICY,
+)
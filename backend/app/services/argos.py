@@ -0,0 +1,41 @@
+"""
+Argos Translate (offline en → hi).
+The package model is installed and loaded on first use rather than at import,
+so processes that never translate offline (e.g. API workers in sidecar mode)
+don't pay for it.
+"""
+import threading
+from pathlib import Path
+
+ARGOS_MODEL = Path(__file__).resolve().parent.parent.parent.parent / "assets" / "models" / "translate-en_hi-1_1.argosmodel"
+_lock = threading.Lock()
+_tried = False
+_hindi_translator = None
+
+
+def load():
+    """Load the en → hi translator once; returns it, or None if unavailable. Blocking."""
+    global _tried, _hindi_translator
+    with _lock:
+        if _tried:
+            return _hindi_translator
+        _tried = True
+        try:
+            if ARGOS_MODEL.exists():
+                import argostranslate.package
+                import argostranslate.translate
+                argostranslate.package.install_from_path(str(ARGOS_MODEL))
+                installed = argostranslate.translate.get_installed_languages()
+                en = next(l for l in installed if l.code == "en")
+                hi = next(l for l in installed if l.code == "hi")
+                _hindi_translator = en.get_translation(hi)
+                print("[Argos] Translate Hindi loaded ✓")
+        except Exception as e:
+            print(f"[Argos] Load failed: {e}")
+        return _hindi_translator
+
+
+def translate_hi(text: str):
+    """English → Hindi, or None when the model is unavailable. Blocking."""
+    translator = load()
+    return translator.translate(text) if translator else None
@@ -0,0 +1,181 @@
+"""
+Audit writer - write-behind queue for non-critical inserts (activity_logs, chat_history).
+Handlers enqueue rows and return immediately; a background task groups them per
+table and flushes them as multi-row inserts when a batch fills up or the flush
+interval passes. Memory is bounded by AUDIT_QUEUE_SIZE (overflow is dropped and
+counted), transient failures are retried, and the queue is drained on shutdown -
+for at most AUDIT_SHUTDOWN_TIMEOUT, after which what is left is dropped and logged.
+"""
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+from postgrest.exceptions import APIError
+from app.core import db
+from app.core.config import settings
+
+class BatchWriter:
+    """Groups rows per table and writes them with one insert per batch."""
+
+    def __init__(self, max_queue: int, batch_size: int, flush_interval: float, max_retries: int):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._queue = None
+        self._task = None
+        self._stopping = None
+        self.stats = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "retries": 0,
+            "dropped_queue_full": 0,
+            "dropped_failed": 0,
+            "dropped_shutdown": 0,
+        }
+
+    def _get_queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        return self._queue
+
+    def enqueue(self, table: str, row: dict) -> bool:
+        """Queue a row for insertion; never blocks. Returns False if it was dropped."""
+        try:
+            self._get_queue().put_nowait((table, row))
+        except asyncio.QueueFull:
+            self.stats["dropped_queue_full"] += 1
+            return False
+        self.stats["enqueued"] += 1
+        return True
+
+    async def start(self):
+        if self._task is None:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued (bounded by AUDIT_SHUTDOWN_TIMEOUT), then stop the task."""
+        if self._task is None:
+            return
+        # Signalled out of band: a full queue (database slow or down) must not block shutdown
+        self._stopping.set()
+        try:
+            await asyncio.wait_for(self._task, settings.AUDIT_SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            lost = self._get_queue().qsize()
+            self.stats["dropped_shutdown"] += lost
+            print(f"[Audit] Shutdown flush timed out, dropping {lost} queued rows (plus the batch in flight)")
+        self._task = None
+
+    async def _run(self):
+        queue = self._get_queue()
+        stopping = self._stopping
+        while not (stopping.is_set() and queue.empty()):
+            # Wait for the first row, then collect until the batch is full or the interval elapses.
+            # Waits are bounded by the flush interval so a stop request is noticed.
+            try:
+                item = await asyncio.wait_for(queue.get(), self.flush_interval)
+            except asyncio.TimeoutError:
+                continue
+            items = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(items) < self.batch_size:
+                if stopping.is_set():
+                    # Draining - take what is queued, don't wait for more
+                    if queue.empty():
+                        break
+                    items.append(queue.get_nowait())
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(items)
+
+    async def _flush(self, items: list):
+        by_table = {}
+        for table, row in items:
+            by_table.setdefault(table, []).append(row)
+        for table, rows in by_table.items():
+            await self._write(table, rows)
+
+    async def _write(self, table: str, rows: list):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await db.execute(db.table(table).insert(rows))
+                self.stats["written"] += len(rows)
+                self.stats["batches"] += 1
+                return
+            except APIError as e:
+                # Rejected by Postgres (constraint/schema) - retrying the batch won't help,
+                # so write rows one by one and keep the ones that are valid.
+                print(f"[Audit] Batch insert into {table} rejected: {e}")
+                await self._write_individually(table, rows)
+                return
+            except Exception as e:
+                if attempt < self.max_retries:
+                    self.stats["retries"] += 1
+                    await asyncio.sleep(min(0.5 * 2 ** attempt, 5))
+                else:
+                    print(f"[Audit] Dropping {len(rows)} {table} rows after {attempt + 1} attempts: {e}")
+        self.stats["dropped_failed"] += len(rows)
+
+    async def _write_individually(self, table: str, rows: list):
+        if len(rows) == 1:
+            self.stats["dropped_failed"] += 1
+            return
+        for row in rows:
+            try:
+                await db.execute(db.table(table).insert(row))
+                self.stats["written"] += 1
+            except Exception:
+                self.stats["dropped_failed"] += 1
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "max_queue": self.max_queue,
+        }
+
+
+writer = BatchWriter(
+    max_queue=settings.AUDIT_QUEUE_SIZE,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL,
+    max_retries=settings.AUDIT_MAX_RETRIES,
+)
+
+
+def _now() -> str:
+    # Rows are stamped when queued, not when flushed, so ordering survives batching
+    return datetime.now(timezone.utc).isoformat()
+
+
+def log_activity(user_id: str, action_type: str, details, policy_id=None) -> bool:
+    """Queue an activity_logs row (``action_type`` must be one the table's CHECK allows)."""
+    return writer.enqueue("activity_logs", {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "policy_id": policy_id,
+        "action_type": action_type,
+        "details": details,
+        "created_at": _now(),
+    })
+
+
+def save_chat_message(user_id: str, policy_id, role: str, content: str) -> bool:
+    """Queue a chat_history row."""
+    return writer.enqueue("chat_history", {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "policy_id": policy_id,
+        "role": role,
+        "message": content,
+        "created_at": _now(),
+    })
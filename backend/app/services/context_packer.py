@@ -0,0 +1,142 @@
+"""
+Context packer - builds prompt context that fits a token budget.
+Chunks are ranked by lexical relevance to the query (BM25 over the candidate
+set), near-duplicates are dropped, and the best chunks are added until the
+budget is used up. Selected chunks keep their original document order.
+"""
+import math
+import re
+from app.services.model_router import estimate_tokens
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = {
+    "the", "and", "for", "are", "was", "with", "that", "this", "from", "what", "which",
+    "who", "how", "can", "does", "will", "shall", "have", "has", "any", "all", "not",
+    "but", "under", "into", "about", "there", "their", "them", "they", "you", "your",
+}
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+
+def count_tokens(text: str) -> int:
+    return estimate_tokens(text)
+
+
+def tokenize(text: str) -> list:
+    return [w for w in _WORD.findall(text.lower()) if len(w) > 2 and w not in STOPWORDS]
+
+
+def score_chunks(query: str, chunks: list) -> list:
+    """BM25 score of every chunk for ``query``, using the chunks themselves as the corpus."""
+    terms = set(tokenize(query))
+    docs = [tokenize(c) for c in chunks]
+    if not terms or not docs:
+        return [0.0] * len(chunks)
+    avg_len = sum(len(d) for d in docs) / len(docs) or 1.0
+    df = {t: sum(1 for d in docs if t in d) for t in terms}
+    scores = []
+    for doc in docs:
+        counts = {}
+        for w in doc:
+            if w in terms:
+                counts[w] = counts.get(w, 0) + 1
+        score = 0.0
+        for t, tf in counts.items():
+            idf = math.log(1 + (len(docs) - df[t] + 0.5) / (df[t] + 0.5))
+            score += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * len(doc) / avg_len))
+        scores.append(score)
+    return scores
+
+
+def _shingles(text: str, n: int = 3) -> set:
+    words = _WORD.findall(text.lower())
+    return {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+
+
+def _is_duplicate(shingles: set, selected: list, threshold: float) -> bool:
+    for other in selected:
+        smaller = min(len(shingles), len(other)) or 1
+        if len(shingles & other) / smaller >= threshold:
+            return True
+    return False
+
+
+def pack_chunks(query: str, chunks: list, budget: int, dedupe_threshold: float = 0.8) -> list:
+    """Most relevant, non-overlapping chunks that fit in ``budget`` tokens.
+
+    Relevant chunks are taken first (highest score first); chunks with no
+    query overlap fill the remaining budget in document order.
+    """
+    if not chunks:
+        return []
+    scores = score_chunks(query, chunks)
+    order = sorted(range(len(chunks)), key=lambda i: (-scores[i], i))
+
+    chosen, seen, used = [], [], 0
+    for i in order:
+        cost = count_tokens(chunks[i])
+        if used + cost > budget:
+            continue
+        shingles = _shingles(chunks[i])
+        if _is_duplicate(shingles, seen, dedupe_threshold):
+            continue
+        chosen.append(i)
+        seen.append(shingles)
+        used += cost
+    return [chunks[i] for i in sorted(chosen)]
+
+
+def pack_history(history: list, budget: int) -> list:
+    """Most recent turns that fit in ``budget`` tokens, in chronological order."""
+    kept, used = [], 0
+    for turn in reversed(history or []):
+        cost = count_tokens(f"{turn.get('role', 'user')}: {turn.get('content', '')}")
+        if used + cost > budget:
+            break
+        kept.append(turn)
+        used += cost
+    return list(reversed(kept))
+
+
+def truncate_to_budget(text: str, budget: int) -> str:
+    """Cut ``text`` to roughly ``budget`` tokens, preferring a paragraph or sentence boundary."""
+    if count_tokens(text) <= budget:
+        return text
+    limit = budget * 4
+    cut = text[:limit]
+    for boundary in ("\n\n", "\n", ". "):
+        pos = cut.rfind(boundary)
+        if pos > limit * 0.8:
+            return cut[:pos + len(boundary)].rstrip()
+    return cut
+
+
+def split_sections(text: str, budget: int) -> list:
+    """Split ``text`` into consecutive sections of at most ~``budget`` tokens.
+
+    Breaks on paragraph boundaries; a paragraph larger than the budget is cut
+    with ``truncate_to_budget`` repeatedly. Nothing is dropped.
+    """
+    sections, current, used = [], [], 0
+    for para in text.split("\n\n"):
+        if not para.strip():
+            continue
+        pieces = []
+        while count_tokens(para) > budget:
+            head = truncate_to_budget(para, budget)
+            pieces.append(head)
+            para = para[len(head):].lstrip()
+        if para:
+            pieces.append(para)
+        for piece in pieces:
+            cost = count_tokens(piece)
+            if current and used + cost > budget:
+                sections.append("\n\n".join(current))
+                current, used = [], 0
+            current.append(piece)
+            used += cost
+    if current:
+        sections.append("\n\n".join(current))
+    return sections
@@ -0,0 +1,118 @@
+"""
+Document store - content-addressed extraction + analysis results.
+An upload is looked up first by the SHA-256 of its file bytes (skips text
+extraction and analysis), then by the hash of its normalized extracted text
+(same document, different file - e.g. re-saved PDF). A hit lets the upload
+clone the stored analysis, clause embeddings included, into a new policy row.
+Only complete analyses are stored: uploads skip results marked ``degraded``
+(local fallback, failed sections, missing clause embeddings), so the next
+upload of that content gets a fresh analysis.
+Lives in a SQLite file under CACHE_DIR, trimmed least recently used first
+once it grows past DOCUMENT_STORE_MAX_MB.
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from app.core.cache import SQLiteLRU, text_key
+from app.core.config import settings
+
+_SCHEMA = """
+    create table if not exists analyses (
+        text_hash text primary key,
+        text text not null,
+        analysis text not null,
+        size integer not null,
+        last_used real not null
+    );
+    create table if not exists files (
+        file_hash text primary key,
+        text_hash text not null
+    );
+"""
+
+
+def file_key(file_bytes: bytes) -> str:
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+class DocumentStore:
+    def __init__(self, path: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._disk = SQLiteLRU(path, "analyses", ("text_hash",), _SCHEMA, max_bytes)
+        self.stats = {"file_hits": 0, "text_hits": 0, "misses": 0, "writes": 0}
+
+    def _get_file(self, conn: sqlite3.Connection, file_hash: str):
+        row = conn.execute(
+            "select a.text_hash, a.text, a.analysis from files f "
+            "join analyses a on a.text_hash = f.text_hash where f.file_hash=?",
+            (file_hash,),
+        ).fetchone()
+        if row:
+            self._disk.touch(conn, (row[0],))
+        return (row[1], json.loads(row[2])) if row else None
+
+    def _get_text(self, conn: sqlite3.Connection, file_hash: str, text_hash: str):
+        """Stored analysis for the text; links ``file_hash`` to it on a hit."""
+        row = conn.execute("select analysis from analyses where text_hash=?", (text_hash,)).fetchone()
+        if not row:
+            return None
+        self._disk.touch(conn, (text_hash,))
+        conn.execute("insert or replace into files values (?, ?)", (file_hash, text_hash))
+        return json.loads(row[0])
+
+    def _put(self, conn: sqlite3.Connection, file_hash: str, text_hash: str, text: str, analysis: dict):
+        payload = json.dumps(analysis, ensure_ascii=False)
+        size = len(text.encode("utf-8")) + len(payload.encode("utf-8"))
+        conn.execute(
+            "insert or replace into analyses values (?, ?, ?, ?, ?)",
+            (text_hash, text, payload, size, time.time()),
+        )
+        conn.execute("insert or replace into files values (?, ?)", (file_hash, text_hash))
+        conn.executemany("delete from files where text_hash=?", self._disk.trim(conn))
+
+    async def get_by_file(self, file_hash: str):
+        """(text, analysis) stored for these exact file bytes, or None."""
+        try:
+            found = await asyncio.to_thread(self._disk.run, self._get_file, file_hash)
+        except sqlite3.Error as e:
+            print(f"[DocumentStore] Read failed: {e}")
+            return None
+        if found:
+            self.stats["file_hits"] += 1
+        return found
+
+    async def get_by_text(self, file_hash: str, text: str):
+        """Analysis stored for the same normalized text; links the new file hash to it."""
+        try:
+            found = await asyncio.to_thread(self._disk.run, self._get_text, file_hash, text_key(text))
+        except sqlite3.Error as e:
+            print(f"[DocumentStore] Read failed: {e}")
+            found = None
+        if found is None:
+            self.stats["misses"] += 1
+        else:
+            self.stats["text_hits"] += 1
+        return found
+
+    async def put(self, file_hash: str, text: str, analysis: dict):
+        try:
+            await asyncio.to_thread(self._disk.run, self._put, file_hash, text_key(text), text, analysis)
+            self.stats["writes"] += 1
+        except sqlite3.Error as e:
+            print(f"[DocumentStore] Write failed: {e}")
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "evicted": self._disk.evicted,
+            "disk_bytes": self._disk.last_size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+store = DocumentStore(
+    path=settings.DOCUMENT_STORE_PATH,
+    max_bytes=settings.DOCUMENT_STORE_MAX_MB * 1024 * 1024,
+)
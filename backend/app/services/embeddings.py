@@ -0,0 +1,84 @@
+# pyre-ignore-all-errors
+"""
+Embeddings - clause and query vectors for retrieval through match_clauses.
+Texts are embedded in batches (one API call per EMBEDDING_BATCH_SIZE texts),
+batches run concurrently up to EMBEDDING_CONCURRENCY. Vectors are sized to
+the clauses.embedding column (vector(1536)). Failures return None so callers
+can fall back to non-vector retrieval.
+"""
+import asyncio
+import time
+import google.generativeai as genai
+from app.core.config import settings
+from app.services import gemini
+
+_semaphore = None
+stats = {"calls": 0, "texts": 0, "failures": 0, "total_time": 0.0}
+
+
+def _slots() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(settings.EMBEDDING_CONCURRENCY)
+    return _semaphore
+
+
+def enabled() -> bool:
+    return gemini.model is not None
+
+
+def clause_text(clause: dict) -> str:
+    """Text embedded for a clause - the same text the chat prompt sees."""
+    text = clause.get("clause_text", "") or ""
+    explanation = clause.get("explanation", "") or ""
+    return f"{text}\nExplanation: {explanation}" if explanation else text
+
+
+async def _embed_batch(texts: list, task_type: str) -> list:
+    async with _slots():
+        start = time.monotonic()
+        stats["calls"] += 1
+        stats["texts"] += len(texts)
+        try:
+            result = await asyncio.wait_for(
+                genai.embed_content_async(
+                    model=settings.EMBEDDING_MODEL,
+                    content=texts,
+                    task_type=task_type,
+                    output_dimensionality=settings.EMBEDDING_DIM,
+                ),
+                timeout=settings.EMBEDDING_TIMEOUT,
+            )
+            return result["embedding"]
+        finally:
+            stats["total_time"] += time.monotonic() - start
+
+
+async def embed_texts(texts: list, task_type: str = "RETRIEVAL_DOCUMENT"):
+    """One vector per text, or None if embedding is unavailable or failed."""
+    if not texts or not enabled():
+        return None
+    size = settings.EMBEDDING_BATCH_SIZE
+    batches = [texts[i:i + size] for i in range(0, len(texts), size)]
+    try:
+        results = await asyncio.gather(*(_embed_batch(b, task_type) for b in batches))
+    except Exception as e:
+        stats["failures"] += 1
+        print(f"[Embeddings] Batch embedding failed: {e}")
+        return None
+    vectors = [v for batch in results for v in batch]
+    return vectors if len(vectors) == len(texts) else None
+
+
+async def embed_query(text: str):
+    vectors = await embed_texts([text], task_type="RETRIEVAL_QUERY")
+    return vectors[0] if vectors else None
+
+
+def metrics() -> dict:
+    return {
+        **stats,
+        "total_time": round(stats["total_time"], 3),
+        "model": settings.EMBEDDING_MODEL,
+        "dimensions": settings.EMBEDDING_DIM,
+    }
@@ -0,0 +1,363 @@
+# pyre-ignore-all-errors
+"""
+Gemini client layer - non-blocking calls with concurrency limits and deadlines.
+Every call goes through ``generate``: it waits for a slot under the global and
+the per-endpoint semaphore, then awaits the async Gemini API under a deadline.
+Which model serves the call is decided by the model router (model_router.py).
+A timed-out or cancelled call (e.g. the client disconnected) cancels the
+upstream request instead of leaving a thread blocked on it.
+"""
+import asyncio
+import time
+from collections import deque
+import google.generativeai as genai
+from app.core.config import parse_limits, settings
+from app.services.model_router import ModelRouter, ModelState, estimate_tokens
+
+# Configure Gemini
+if settings.GEMINI_API_KEY:
+    genai.configure(api_key=settings.GEMINI_API_KEY)
+    model = genai.GenerativeModel(settings.GEMINI_PRIMARY_MODEL)
+    fallback_model = genai.GenerativeModel(settings.GEMINI_FALLBACK_MODEL)
+else:
+    model = None
+    fallback_model = None
+
+
+class LLMTimeoutError(Exception):
+    """The call (including time spent waiting for a slot) exceeded its deadline."""
+
+
+ENDPOINT_CONCURRENCY = parse_limits(settings.LLM_ENDPOINT_CONCURRENCY)
+ENDPOINT_TIMEOUTS = parse_limits(settings.LLM_ENDPOINT_TIMEOUTS)
+
+# Semaphores are created lazily so they bind to the running event loop
+_global_limit = None
+_endpoint_limits = {}
+_stats = {}
+
+
+def _endpoint_stats(endpoint: str) -> dict:
+    if endpoint not in _stats:
+        _stats[endpoint] = {"calls": 0, "in_flight": 0, "waiting": 0, "timeouts": 0, "cancelled": 0, "errors": 0}
+    return _stats[endpoint]
+
+
+def _semaphores(endpoint: str):
+    global _global_limit
+    if _global_limit is None:
+        _global_limit = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+    if endpoint not in _endpoint_limits:
+        limit = int(ENDPOINT_CONCURRENCY.get(endpoint, settings.LLM_MAX_CONCURRENCY))
+        _endpoint_limits[endpoint] = asyncio.Semaphore(limit)
+    return _global_limit, _endpoint_limits[endpoint]
+
+
+def _is_quota_error(e: Exception) -> bool:
+    err_str = str(e).lower()
+    return "429" in err_str or "quota" in err_str or "exhausted" in err_str
+
+
+def _is_retryable(e: Exception) -> bool:
+    """Errors worth retrying on another model: quota and server-side failures."""
+    err_str = str(e).lower()
+    return _is_quota_error(e) or any(
+        marker in err_str for marker in ("500", "503", "unavailable", "internal", "overloaded")
+    )
+
+
+router = ModelRouter(
+    [
+        ModelState(name, m, rpm, tpm,
+                   window=settings.LLM_ROUTER_WINDOW,
+                   error_threshold=settings.LLM_ROUTER_ERROR_THRESHOLD,
+                   cooldown=settings.LLM_ROUTER_COOLDOWN)
+        for name, m, rpm, tpm in (
+            (settings.GEMINI_PRIMARY_MODEL, model, settings.GEMINI_PRIMARY_RPM, settings.GEMINI_PRIMARY_TPM),
+            (settings.GEMINI_FALLBACK_MODEL, fallback_model, settings.GEMINI_FALLBACK_RPM, settings.GEMINI_FALLBACK_TPM),
+        )
+    ],
+    max_quota_wait=settings.LLM_MAX_QUOTA_WAIT,
+)
+
+
+async def _call_model(state: ModelState, prompt: str, estimated_tokens: int, **kwargs):
+    """One attempt on one model, feeding the outcome back into the router."""
+    started = time.monotonic()
+    try:
+        response = await state.model.generate_content_async(prompt, **kwargs)
+    except asyncio.CancelledError:
+        state.probing = False
+        raise
+    except Exception as e:
+        state.record_failure(_is_quota_error(e), str(e))
+        raise
+    try:
+        total_tokens = response.usage_metadata.total_token_count or 0
+    except Exception:
+        total_tokens = 0
+    state.record_success(time.monotonic() - started, total_tokens, estimated_tokens)
+    return response
+
+
+async def _generate_with_fallback(prompt: str, tried: list = None, last_error: Exception = None, **kwargs):
+    """Send the prompt to the model the router picks; on quota or server errors try the next one."""
+    if not router.models:
+        raise Exception("No model available")
+    tokens = estimate_tokens(prompt)
+    tried = list(tried or [])
+    while True:
+        state = await router.acquire(tokens, exclude=tried)
+        if state is None:
+            raise last_error or Exception("No model available")
+        tried.append(state.name)
+        try:
+            return await _call_model(state, prompt, tokens, **kwargs)
+        except Exception as e:
+            if not _is_retryable(e):
+                raise
+            print(f"[LLM] {state.name} failed ({str(e)[:80]}). Trying next model...")
+            last_error = e
+
+
+# ── Hedging: if the primary is slow, race the same prompt on the next model ──
+
+HEDGE_ENDPOINTS = {e.strip() for e in settings.LLM_HEDGE_ENDPOINTS.split(",") if e.strip()}
+_hedge_latencies = {}
+_hedge_stats = {}
+
+
+def _hedge_delay(endpoint: str) -> float:
+    """Seconds to wait for the primary before hedging: a percentile of its recent latency."""
+    samples = _hedge_latencies.get(endpoint)
+    if not samples or len(samples) < settings.LLM_HEDGE_MIN_SAMPLES:
+        return settings.LLM_HEDGE_DEFAULT_DELAY
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(settings.LLM_HEDGE_PERCENTILE / 100.0 * len(ordered)))
+    return max(settings.LLM_HEDGE_MIN_DELAY, ordered[index])
+
+
+def _record_primary(endpoint: str, seconds: float):
+    _hedge_latencies.setdefault(endpoint, deque(maxlen=200)).append(seconds)
+
+
+async def _generate_hedged(prompt: str, endpoint: str):
+    tokens = estimate_tokens(prompt)
+    stats = _hedge_stats.setdefault(endpoint, {"calls": 0, "hedges_fired": 0, "hedges_won": 0})
+    stats["calls"] += 1
+    primary = await router.acquire(tokens)
+    if primary is None:
+        raise Exception("No model available")
+
+    started = time.monotonic()
+    primary_task = asyncio.ensure_future(_call_model(primary, prompt, tokens))
+    # Every primary outcome is sampled, not just wins - otherwise slow primaries that
+    # lose to the hedge drop out and the delay keeps shrinking
+    primary_task.add_done_callback(
+        lambda t: None if t.cancelled() else _record_primary(endpoint, time.monotonic() - started)
+    )
+    tasks = [primary_task]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=_hedge_delay(endpoint))
+        backup = None if done else await router.acquire(tokens, exclude=[primary.name], wait=False)
+        if backup is not None:
+            stats["hedges_fired"] += 1
+            tasks.append(asyncio.ensure_future(_call_model(backup, prompt, tokens)))
+
+        # First successful answer wins; the loser is cancelled in ``finally``
+        pending = set(tasks)
+        last_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary_task:
+                        stats["hedges_won"] += 1
+                    return task.result()
+                last_error = task.exception()
+        if not _is_retryable(last_error):
+            raise last_error
+        tried = [primary.name] + ([backup.name] if backup is not None else [])
+        return await _generate_with_fallback(prompt, tried=tried, last_error=last_error)
+    finally:
+        if not primary_task.done():
+            # Lost to the hedge: it took at least this long (a censored sample)
+            _record_primary(endpoint, time.monotonic() - started)
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def _acquire(endpoint: str, stats: dict):
+    """Wait for a per-endpoint and a global slot; returns the semaphores to release."""
+    global_limit, endpoint_limit = _semaphores(endpoint)
+    stats["waiting"] += 1
+    try:
+        await endpoint_limit.acquire()
+        try:
+            await global_limit.acquire()
+        except BaseException:
+            endpoint_limit.release()
+            raise
+    finally:
+        stats["waiting"] -= 1
+    stats["in_flight"] += 1
+    return global_limit, endpoint_limit
+
+
+def _release(slots, stats: dict):
+    stats["in_flight"] -= 1
+    for sem in slots:
+        sem.release()
+
+
+async def _limited(prompt: str, endpoint: str, stats: dict):
+    slots = await _acquire(endpoint, stats)
+    try:
+        if endpoint in HEDGE_ENDPOINTS and len(router.models) > 1:
+            return await _generate_hedged(prompt, endpoint)
+        return await _generate_with_fallback(prompt)
+    finally:
+        _release(slots, stats)
+
+
+async def _generate_once(prompt: str, endpoint: str, timeout: float = None):
+    deadline = timeout or ENDPOINT_TIMEOUTS.get(endpoint, settings.LLM_TIMEOUT)
+    stats = _endpoint_stats(endpoint)
+    stats["calls"] += 1
+    try:
+        return await asyncio.wait_for(_limited(prompt, endpoint, stats), deadline)
+    except asyncio.TimeoutError:
+        stats["timeouts"] += 1
+        raise LLMTimeoutError(f"Gemini call for '{endpoint}' exceeded {deadline:g}s")
+    except asyncio.CancelledError:
+        stats["cancelled"] += 1
+        raise
+    except Exception:
+        stats["errors"] += 1
+        raise
+
+
+# ── Single-flight: identical prompts in flight share one upstream call ──
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+_inflight = {}
+_flight_stats = {"upstream_calls": 0, "deduplicated": 0}
+
+
+def _flight_done(prompt: str, flight: _Flight):
+    if _inflight.get(prompt) is flight:
+        del _inflight[prompt]
+    if not flight.task.cancelled():
+        flight.task.exception()  # mark retrieved; waiters re-raise it themselves
+
+
+async def generate(prompt: str, endpoint: str = "default", timeout: float = None):
+    """Run ``prompt`` on Gemini without blocking the event loop.
+
+    ``timeout`` defaults to the endpoint's deadline (LLM_ENDPOINT_TIMEOUTS) and
+    covers both the wait for a concurrency slot and the call itself. Callers
+    asking for a prompt that is already in flight wait for that call instead of
+    starting another; it is cancelled only when every waiter has gone away.
+    """
+    if not settings.LLM_SINGLE_FLIGHT:
+        return await _generate_once(prompt, endpoint, timeout)
+
+    flight = _inflight.get(prompt)
+    if flight is None:
+        flight = _Flight(asyncio.ensure_future(_generate_once(prompt, endpoint, timeout)))
+        _inflight[prompt] = flight
+        flight.task.add_done_callback(lambda _task, p=prompt, f=flight: _flight_done(p, f))
+        _flight_stats["upstream_calls"] += 1
+    else:
+        _flight_stats["deduplicated"] += 1
+
+    flight.waiters += 1
+    try:
+        return await asyncio.shield(flight.task)
+    except asyncio.CancelledError:
+        if flight.waiters == 1 and not flight.task.done():
+            flight.task.cancel()
+        raise
+    finally:
+        flight.waiters -= 1
+
+
+async def stream(prompt: str, endpoint: str = "default", timeout: float = None):
+    """Yield the response text piece by piece as Gemini generates it.
+
+    Holds the endpoint's concurrency slot for the whole stream; the deadline
+    applies to the complete stream, not to each piece.
+    """
+    deadline = timeout or ENDPOINT_TIMEOUTS.get(endpoint, settings.LLM_TIMEOUT)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    ends_at = started + deadline
+    stats = _endpoint_stats(endpoint)
+    stats["calls"] += 1
+    slots = None
+    try:
+        slots = await asyncio.wait_for(_acquire(endpoint, stats), deadline)
+        response = await asyncio.wait_for(
+            _generate_with_fallback(prompt, stream=True), ends_at - loop.time()
+        )
+        chunks = response.__aiter__()
+        first = True
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), ends_at - loop.time())
+            except StopAsyncIteration:
+                break
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety/finish metadata)
+                continue
+            if text:
+                if first:
+                    _record_ttft(stats, loop.time() - started)
+                    first = False
+                yield text
+    except asyncio.TimeoutError:
+        stats["timeouts"] += 1
+        raise LLMTimeoutError(f"Gemini stream for '{endpoint}' exceeded {deadline:g}s")
+    except (asyncio.CancelledError, GeneratorExit):
+        stats["cancelled"] += 1
+        raise
+    except Exception:
+        stats["errors"] += 1
+        raise
+    finally:
+        if slots is not None:
+            _release(slots, stats)
+
+
+def _record_ttft(stats: dict, seconds: float):
+    stats["streams"] = stats.get("streams", 0) + 1
+    stats["ttft_total"] = stats.get("ttft_total", 0.0) + seconds
+
+
+def router_state() -> dict:
+    return router.state()
+
+
+def metrics() -> dict:
+    endpoints = {}
+    for name, s in _stats.items():
+        item = {k: v for k, v in s.items() if k != "ttft_total"}
+        if s.get("streams"):
+            item["avg_time_to_first_token_ms"] = round(1000 * s["ttft_total"] / s["streams"])
+        endpoints[name] = item
+    return {
+        "max_concurrency": settings.LLM_MAX_CONCURRENCY,
+        "endpoints": endpoints,
+        "single_flight": {**_flight_stats, "in_flight": len(_inflight)},
+        "hedging": {
+            name: {**s, "delay_ms": round(1000 * _hedge_delay(name))} for name, s in _hedge_stats.items()
+        },
+    }
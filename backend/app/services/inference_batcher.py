@@ -0,0 +1,129 @@
+"""
+Inference batcher - cross-request dynamic batching for local models.
+Concurrent callers submit single items (a text chunk to summarize, a text to
+classify); a scheduler task collects them for up to INFERENCE_BATCH_WINDOW_MS
+or until the batch is full, runs one batched forward pass on the local inference pool
+and hands each caller its own result. One batch per model runs at a time, so
+requests stop competing for the same CPU cores.
+"""
+import asyncio
+import bisect
+import time
+from app.core.config import settings
+from app.services import local_inference
+
+_batchers = []
+
+
+class Histogram:
+    """Per-bucket counts (previous bound < value <= bound) plus count and mean."""
+
+    def __init__(self, bounds: list):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def snapshot(self) -> dict:
+        buckets = {f"le_{b:g}": c for b, c in zip(self.bounds, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 2) if self.count else 0,
+            "buckets": buckets,
+        }
+
+
+class DynamicBatcher:
+    """Groups single-item calls to ``run_batch(items) -> results`` (a blocking function)."""
+
+    def __init__(self, name: str, run_batch, max_batch, window_ms: float = None):
+        self.name = name
+        self.run_batch = run_batch
+        self._max_batch = max_batch
+        self.window = (settings.INFERENCE_BATCH_WINDOW_MS if window_ms is None else window_ms) / 1000.0
+        self._queue = None
+        self._task = None
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32])
+        self.queue_wait_ms = Histogram([1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000])
+        self.stats = {"items": 0, "batches": 0, "errors": 0, "busy_time": 0.0}
+        _batchers.append(self)
+
+    def max_batch(self) -> int:
+        return max(1, self._max_batch() if callable(self._max_batch) else self._max_batch)
+
+    def _ensure_started(self) -> asyncio.Queue:
+        # Queue and scheduler are created lazily so they bind to the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._schedule())
+        return self._queue
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        self._ensure_started().put_nowait((item, future, time.monotonic()))
+        self.stats["items"] += 1
+        return await future
+
+    async def _schedule(self):
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            limit = self.max_batch()
+            deadline = time.monotonic() + self.window
+            while len(batch) < limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # Callers that gave up (e.g. request cancelled) don't need a slot in the batch
+            batch = [entry for entry in batch if not entry[1].done()]
+            if batch:
+                await self._run(batch)
+
+    async def _run(self, batch: list):
+        now = time.monotonic()
+        for _, _, queued_at in batch:
+            self.queue_wait_ms.observe((now - queued_at) * 1000)
+        self.batch_sizes.observe(len(batch))
+        self.stats["batches"] += 1
+        try:
+            results = await local_inference.run(self.run_batch, [item for item, _, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"{self.name}: {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"[Batcher] {self.name} batch of {len(batch)} failed: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.stats["busy_time"] += time.monotonic() - now
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "busy_time": round(self.stats["busy_time"], 3),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "max_batch": self.max_batch(),
+            "window_ms": self.window * 1000,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+        }
+
+
+def metrics() -> dict:
+    return {b.name: b.metrics() for b in _batchers}
@@ -0,0 +1,137 @@
+"""
+Inference client - thin async client for the inference sidecar (app/inference_server.py).
+Used when INFERENCE_MODE=sidecar: API workers keep no local models and send
+analysis / offline translation to the one sidecar process on the node, over
+a Unix socket (INFERENCE_SOCKET) or local HTTP (INFERENCE_URL).
+Every call carries a deadline, which the sidecar also enforces. While the
+sidecar is restarting (connection refused, or 503 while it loads its models),
+calls retry with backoff until the deadline runs out. A background task checks
+/health so the sidecar's state shows up in /api/health and /admin/metrics.
+"""
+import asyncio
+import time
+import httpx
+from fastapi import HTTPException
+from app.core.config import settings
+
+_client = None
+_health_task = None
+_health = {"healthy": False, "status": "unknown", "checked_at": None, "error": None}
+stats = {"calls": 0, "errors": 0, "retries": 0, "timeouts": 0}
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        if settings.INFERENCE_URL:
+            _client = httpx.AsyncClient(base_url=settings.INFERENCE_URL)
+        else:
+            _client = httpx.AsyncClient(
+                base_url="http://inference",
+                transport=httpx.AsyncHTTPTransport(uds=settings.INFERENCE_SOCKET),
+            )
+    return _client
+
+
+def _unavailable(reason: str):
+    stats["errors"] += 1
+    raise HTTPException(status_code=503, detail=f"Local inference service unavailable: {reason}")
+
+
+async def _post(path: str, payload: dict, timeout: float = None) -> dict:
+    timeout = timeout or settings.INFERENCE_TIMEOUT
+    deadline = time.monotonic() + timeout
+    backoff = 0.25
+    stats["calls"] += 1
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            stats["timeouts"] += 1
+            _unavailable("deadline exceeded")
+        try:
+            response = await _get_client().post(
+                path,
+                json=payload,
+                timeout=remaining,
+                headers={"X-Request-Timeout": f"{remaining:.2f}"},
+            )
+        except (httpx.ConnectError, httpx.RemoteProtocolError) as e:
+            # Sidecar down or restarting - retry until the deadline
+            reason = f"{e.__class__.__name__}: {e}"
+        except httpx.TimeoutException:
+            stats["timeouts"] += 1
+            _unavailable("deadline exceeded")
+        else:
+            if response.status_code == 503:
+                reason = "sidecar not ready"
+            elif response.status_code == 504:
+                stats["timeouts"] += 1
+                _unavailable("deadline exceeded in sidecar")
+            else:
+                if response.status_code >= 400:
+                    _unavailable(f"HTTP {response.status_code}: {response.text[:200]}")
+                return response.json()
+        if time.monotonic() + backoff >= deadline:
+            _unavailable(reason)
+        stats["retries"] += 1
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 2.0)
+
+
+async def analyze_policy(text: str) -> dict:
+    return await _post("/analyze", {"text": text})
+
+
+async def translate(text: str, target_language: str):
+    """Offline translation, or None if the sidecar has no model for it."""
+    result = await _post("/translate", {"text": text, "target_language": target_language})
+    return result.get("translated")
+
+
+# ── Health ──
+
+async def check_health() -> dict:
+    try:
+        response = await _get_client().get("/health", timeout=settings.INFERENCE_HEALTH_TIMEOUT)
+        body = response.json()
+        healthy = response.status_code == 200 and body.get("status") == "ready"
+        _health.update(healthy=healthy, status=body.get("status", "unknown"), error=None)
+    except Exception as e:
+        _health.update(healthy=False, status="unreachable", error=f"{e.__class__.__name__}: {e}")
+    _health["checked_at"] = time.time()
+    return dict(_health)
+
+
+async def _monitor():
+    was_healthy = None
+    while True:
+        state = await check_health()
+        if state["healthy"] != was_healthy:
+            print(f"[Inference] Sidecar {'healthy' if state['healthy'] else 'UNHEALTHY'}: {state['status']}")
+            was_healthy = state["healthy"]
+        await asyncio.sleep(settings.INFERENCE_HEALTH_INTERVAL)
+
+
+async def start():
+    global _health_task
+    if _health_task is None:
+        _health_task = asyncio.create_task(_monitor())
+
+
+async def stop():
+    global _health_task, _client
+    if _health_task is not None:
+        _health_task.cancel()
+        await asyncio.gather(_health_task, return_exceptions=True)
+        _health_task = None
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def health() -> dict:
+    return dict(_health)
+
+
+def metrics() -> dict:
+    return {**stats, "mode": settings.INFERENCE_MODE, **_health}
@@ -0,0 +1,360 @@
+"""
+Job queue - durable background jobs (policy uploads) with stage progress.
+Jobs are rows in a SQLite file under CACHE_DIR and their input files are
+spooled to disk, so a queued or interrupted job survives a restart.
+All API workers on a host share the file: each claims queued rows atomically
+and holds a lease on the jobs it runs, renewed every JOB_LEASE_SECONDS / 3.
+A job whose lease lapses (its process died) is requeued by whichever worker
+notices first (up to JOB_MAX_ATTEMPTS). A fixed pool of JOB_WORKERS tasks per
+process polls for work; handlers report progress through a callback, which is
+persisted, and watchers poll the row, so any worker can serve a job's SSE.
+Replicas on other hosts need their own file (and sticky job routing).
+"""
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from fastapi import HTTPException
+from app.core.config import settings
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+STARTING = "starting"  # stage of a just-claimed job, until its handler reports one
+FINISHED = (SUCCEEDED, FAILED)
+
+_COLUMNS = "id, kind, user_id, status, stage, progress, params, file_path, result, error, attempts, created_at, updated_at"
+# Added after the first release; older job files get them with ALTER TABLE
+_LEASE_COLUMNS = {"owner": "text", "lease_until": "real"}
+
+
+class JobQueue:
+    def __init__(self, path: str, spool_dir: str, workers: int, max_attempts: int):
+        self.path = path
+        self.spool_dir = Path(spool_dir)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.handlers = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        self._wakeup = None
+        self._tasks = []
+        self._backlog = 0
+        self._run_time = 30.0
+        # Unique per process (and per restart), so a restarted worker never inherits leases
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.stats = {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0, "requeued": 0, "running": 0,
+                      "lost_leases": 0}
+
+    def register(self, kind: str, handler):
+        """``handler(job, report)`` runs a job; ``await report(stage, progress)`` records progress."""
+        self.handlers[kind] = handler
+
+    # ── storage ──
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                create table if not exists jobs (
+                    id text primary key,
+                    kind text not null,
+                    user_id text not null,
+                    status text not null,
+                    stage text not null,
+                    progress integer not null default 0,
+                    params text not null,
+                    file_path text,
+                    result text,
+                    error text,
+                    attempts integer not null default 0,
+                    created_at real not null,
+                    updated_at real not null
+                )
+            """)
+            existing = {row[1] for row in conn.execute("pragma table_info(jobs)")}
+            for column, kind in _LEASE_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"alter table jobs add column {column} {kind}")
+            conn.execute("create index if not exists jobs_status on jobs(status, created_at)")
+            self._conn = conn
+        return self._conn
+
+    def _sql(self, query: str, args: tuple = (), fetch: bool = False):
+        with self._lock:
+            conn = self._db()
+            cursor = conn.execute(query, args)
+            rows = cursor.fetchall() if fetch else cursor.rowcount
+            conn.commit()
+            return rows
+
+    @staticmethod
+    def _row(row) -> dict:
+        job = dict(zip([c.strip() for c in _COLUMNS.split(",")], row))
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _load(self, job_id: str):
+        rows = self._sql(f"select {_COLUMNS} from jobs where id=?", (job_id,), fetch=True)
+        return self._row(rows[0]) if rows else None
+
+    def _get_wakeup(self) -> asyncio.Event:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        return self._wakeup
+
+    # ── public API ──
+
+    async def submit(self, kind: str, user_id: str, params: dict, file_bytes: bytes = None) -> str:
+        job_id = str(uuid.uuid4())
+        file_path = None
+        if file_bytes is not None:
+            file_path = str(self.spool_dir / job_id)
+            await asyncio.to_thread(self._spool, file_path, file_bytes)
+        now = time.time()
+        await asyncio.to_thread(
+            self._sql,
+            f"insert into jobs ({_COLUMNS}) values (?, ?, ?, ?, ?, 0, ?, ?, null, null, 0, ?, ?)",
+            (job_id, kind, user_id, QUEUED, QUEUED, json.dumps(params), file_path, now, now),
+        )
+        self.stats["submitted"] += 1
+        self._backlog += 1
+        # Wake a local worker now; other processes pick it up on their next poll
+        self._get_wakeup().set()
+        return job_id
+
+    def _spool(self, file_path: str, file_bytes: bytes):
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(file_bytes)
+
+    async def get(self, job_id: str):
+        return await asyncio.to_thread(self._load, job_id)
+
+    def public(self, job: dict) -> dict:
+        """What clients see of a job."""
+        return {
+            "job_id": job["id"],
+            "status": job["status"],
+            "stage": job["stage"],
+            "progress": job["progress"],
+            "result": job["result"],
+            "error": job["error"],
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"],
+        }
+
+    async def watch(self, job_id: str):
+        """Yield the job every time it changes, until it finishes.
+        Polls the row, so it works whichever process is running the job."""
+        job = await self.get(job_id)
+        last = None
+        while job is not None:
+            if job["updated_at"] != last:
+                yield job
+                last = job["updated_at"]
+            if job["status"] in FINISHED:
+                return
+            await asyncio.sleep(min(0.5, settings.JOB_POLL_INTERVAL))
+            job = await self.get(job_id)
+
+    def queued(self) -> int:
+        """Queued jobs across all processes sharing the file (as of the last poll)."""
+        return self._backlog
+
+    def retry_after(self) -> int:
+        """Seconds until the backlog has likely drained by one job per worker."""
+        return max(1, int(self._run_time * (self.queued() + 1) / max(1, self.workers)))
+
+    # ── workers ──
+
+    async def start(self):
+        if self._tasks:
+            return
+        await asyncio.to_thread(self._maintain)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._housekeeper()))
+        print(f"[Jobs] {self.workers} workers started ({self.owner}), {self.queued()} jobs queued")
+
+    def _maintain(self):
+        """Renew our leases, requeue jobs whose lease lapsed, drop finished jobs past retention."""
+        now = time.time()
+        lease_until = now + settings.JOB_LEASE_SECONDS
+        self._sql("update jobs set lease_until=? where status=? and owner=?", (lease_until, RUNNING, self.owner))
+        requeued = self._sql(
+            "update jobs set status=?, stage=?, owner=null, lease_until=null, updated_at=? "
+            "where status=? and coalesce(lease_until, 0) < ? and attempts < ?",
+            (QUEUED, QUEUED, now, RUNNING, now, self.max_attempts),
+        )
+        self._sql(
+            "update jobs set status=?, stage=?, error=?, owner=null, updated_at=? "
+            "where status=? and coalesce(lease_until, 0) < ?",
+            (FAILED, FAILED, "Interrupted too many times", now, RUNNING, now),
+        )
+        if requeued:
+            self.stats["requeued"] += requeued
+            print(f"[Jobs] Requeued {requeued} jobs whose lease expired")
+        cutoff = now - settings.JOB_RETENTION_HOURS * 3600
+        for (file_path,) in self._sql(
+            "select file_path from jobs where status in (?, ?) and updated_at < ?", (*FINISHED, cutoff), fetch=True
+        ):
+            self._unspool(file_path)
+        self._sql("delete from jobs where status in (?, ?) and updated_at < ?", (*FINISHED, cutoff))
+        self._backlog = self._sql("select count(*) from jobs where status=?", (QUEUED,), fetch=True)[0][0]
+
+    async def _housekeeper(self):
+        while True:
+            await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+            try:
+                await asyncio.to_thread(self._maintain)
+            except Exception as e:
+                print(f"[Jobs] Housekeeping failed: {e}")
+
+    async def stop(self):
+        """Stop the workers and hand the jobs they were running back to the queue."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Another process (or our next start) can pick them up without waiting for the lease to lapse
+        await asyncio.to_thread(
+            self._sql,
+            "update jobs set status=?, stage=?, owner=null, lease_until=null, updated_at=? where status=? and owner=?",
+            (QUEUED, QUEUED, time.time(), RUNNING, self.owner),
+        )
+
+    def _claim(self):
+        """Atomically move the oldest queued job to running under our lease; its id, or None."""
+        while True:
+            rows = self._sql("select id from jobs where status=? order by created_at limit 1", (QUEUED,), fetch=True)
+            if not rows:
+                self._backlog = 0
+                return None
+            now = time.time()
+            # Conditional update: of several processes racing for the row, exactly one wins
+            claimed = self._sql(
+                "update jobs set status=?, stage=?, owner=?, lease_until=?, attempts=attempts+1, updated_at=? "
+                "where id=? and status=?",
+                (RUNNING, STARTING, self.owner, now + settings.JOB_LEASE_SECONDS, now, rows[0][0], QUEUED),
+            )
+            if claimed:
+                self._backlog = max(0, self._backlog - 1)
+                return rows[0][0]
+
+    async def _worker(self, n: int):
+        wakeup = self._get_wakeup()
+        backoff = settings.JOB_POLL_INTERVAL
+        while True:
+            job_id = None
+            try:
+                job_id = await asyncio.to_thread(self._claim)
+                backoff = settings.JOB_POLL_INTERVAL
+                if job_id is None:
+                    wakeup.clear()
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), settings.JOB_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if job_id is None:
+                    # e.g. "database is locked" - the file is shared by every worker on the host
+                    print(f"[Jobs] Worker {n} could not claim a job: {e}; retrying in {backoff:.1f}s")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                else:
+                    print(f"[Jobs] Worker {n} crashed on {job_id}: {e}")
+
+    async def _update(self, job_id: str, **fields) -> bool:
+        """Update a job we hold the lease on; False if the lease was lost to another process."""
+        fields["updated_at"] = time.time()
+        for key in ("result", "params"):
+            if key in fields:
+                fields[key] = json.dumps(fields[key], ensure_ascii=False, default=str)
+        assignments = ", ".join(f"{k}=?" for k in fields)
+        updated = await asyncio.to_thread(
+            self._sql,
+            f"update jobs set {assignments} where id=? and status=? and owner=?",
+            (*fields.values(), job_id, RUNNING, self.owner),
+        )
+        if not updated:
+            self.stats["lost_leases"] += 1
+        return bool(updated)
+
+    async def _run(self, job_id: str):
+        job = await self.get(job_id)
+        handler = self.handlers.get(job["kind"])
+
+        async def report(stage: str, progress: int):
+            if not await self._update(job_id, stage=stage, progress=progress):
+                raise RuntimeError("Job lease lost to another worker")
+
+        self.stats["running"] += 1
+        started = time.monotonic()
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler for job kind '{job['kind']}'")
+            result = await handler(job, report)
+        except HTTPException as e:
+            await self._finish(job, FAILED, error=str(e.detail))
+        except asyncio.CancelledError:
+            # Shutdown - leave it 'running' so the next start requeues it
+            raise
+        except Exception as e:
+            print(f"[Jobs] Job {job_id} failed: {e}")
+            await self._finish(job, FAILED, error=str(e) or e.__class__.__name__)
+        else:
+            await self._finish(job, SUCCEEDED, result=result)
+        finally:
+            self.stats["running"] -= 1
+            self._run_time = 0.8 * self._run_time + 0.2 * (time.monotonic() - started)
+
+    async def _finish(self, job: dict, status: str, result=None, error: str = None):
+        self.stats[status] += 1
+        fields = {"status": status, "stage": status, "error": error}
+        if status == SUCCEEDED:
+            fields.update(progress=100, result=result)
+        if not await self._update(job["id"], **fields):
+            print(f"[Jobs] Job {job['id']} lease lost before it finished; result dropped")
+            return
+        if job["file_path"]:
+            await asyncio.to_thread(self._unspool, job["file_path"])
+
+    @staticmethod
+    def _unspool(file_path: str):
+        if file_path:
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+
+    def read_file(self, job: dict) -> bytes:
+        with open(job["file_path"], "rb") as f:
+            return f.read()
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "queued": self.queued(),
+            "queue_limit": settings.JOB_QUEUE_LIMIT,
+            "workers": self.workers if self._tasks else 0,
+            "owner": self.owner,
+            "avg_run_s": round(self._run_time, 2),
+        }
+
+
+queue = JobQueue(
+    path=settings.JOB_DB_PATH,
+    spool_dir=settings.JOB_SPOOL_DIR,
+    workers=settings.JOB_WORKERS,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+)
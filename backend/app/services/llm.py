@@ -3,106 +3,57 @@
 LLM Service - Uses Google Gemini for translation, chatbot, and comparisons.
 Summarization is handled by the BART-based summarizer service.
 """
+import asyncio
 import json
 import time
-import google.generativeai as genai
+from app.core import admission
 from app.core.config import settings
+from app.services import argos, context_packer, gemini, inference_client, local_inference, retrieval
+from app.services.translation_cache import cache as translation_cache
+
+model = gemini.model
 
-# Configure Gemini
-if settings.GEMINI_API_KEY:
-    genai.configure(api_key=settings.GEMINI_API_KEY)
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    fallback_model = genai.GenerativeModel("gemini-2.5-flash-lite")
-else:
-    model = None
-    fallback_model = None
-
-def generate_content_with_fallback(prompt: str):
-    """Attempt primary model, smoothly fallback to high-capacity 1.5-flash on quota constraints."""
-    try:
-        if not model:
-            raise Exception("No model available")
-        return model.generate_content(prompt)
-    except Exception as e:
-        err_str = str(e).lower()
-        if ("429" in err_str or "quota" in err_str or "exhausted" in err_str) and fallback_model:
-            print("[LLM] Primary Gemini 2.5 quota met. Seamlessly falling back to Gemini 1.5 Flash...")
-            return fallback_model.generate_content(prompt)
-        raise e
+
+async def generate_content_with_fallback(prompt: str, endpoint: str = "default"):
+    """Run a prompt through the async Gemini client layer (primary → lite fallback on quota)."""
+    return await gemini.generate(prompt, endpoint=endpoint)
 
 
 
 # Fallback translation engines
 from deep_translator import GoogleTranslator
-import argostranslate.package
-import argostranslate.translate
-from pathlib import Path
-import os
-
-# Initialize Argos Translate for Hindi (Offline)
-ARGOS_MODEL = Path(__file__).resolve().parent.parent.parent.parent / "assets" / "models" / "translate-en_hi-1_1.argosmodel"
-_argos_ready = False
-_hindi_translator = None
-
-def _init_argos():
-    global _argos_ready, _hindi_translator
-    if _argos_ready: return True
-    try:
-        if ARGOS_MODEL.exists():
-            argostranslate.package.install_from_path(str(ARGOS_MODEL))
-            installed = argostranslate.translate.get_installed_languages()
-            en = next(l for l in installed if l.code == "en")
-            hi = next(l for l in installed if l.code == "hi")
-            _hindi_translator = en.get_translation(hi)
-            _argos_ready = True
-            print("[LLM] Argos Translate Hindi loaded ✓")
-            return True
-    except Exception as e:
-        print(f"[LLM] Argos load failed: {e}")
-    return False
 
-# Initialize at import
-_init_argos()
 
-async def chat_with_context(query: str, context_chunks: list, chat_history: list = None) -> str:
-    """RAG-based chat with policy context using Gemini."""
-    if not model:
-        # Fallback: Simple keyword search in context
-        query_lower = query.lower()
-        best_chunks = []
-        
-        if context_chunks:
-            # Score chunks by keyword match
-            pairs = [] # type: list[tuple[int, str]]
-            words = [w for w in query_lower.split() if len(w) > 3]
-            for chunk in context_chunks:
-                score = sum(1 for w in words if w in chunk.lower())
-                pairs.append((score, chunk))
-            
-            pairs.sort(key=lambda x: x[0], reverse=True)
-            best_chunks = [p[1] for p in pairs if p[0] > 0][:2]
-
-        if best_chunks:
-            context_text = "\n\n".join(best_chunks)
-            history_list = []
-            for h in (chat_history or [])[-5:]:
-                role = h.get('role', 'user') # type: ignore
-                content = h.get('content', '') # type: ignore
-                history_list.append(f"{role}: {content}")
-            history_text = "\n".join(history_list)
-            return f"*(AI Offline Mode)* I found this in the policy: \n\n{context_text}\n\n(Note: For better conversational replies, please add GEMINI_API_KEY)"
-        return "*(AI Offline Mode)* I'm sorry, I couldn't find a direct answer in the policy. Without an API key, my reasoning is limited."
-
-    context = "\n\n".join(context_chunks[:5]) if context_chunks else ""
+async def _argos_translate(text: str):
+    """Offline en → hi: in the inference sidecar, or in-process (model loaded on first use)."""
+    if settings.INFERENCE_MODE == "sidecar":
+        return await inference_client.translate(text, "hi")
+    return await local_inference.run(argos.translate_hi, text)
+
+
+def _offline_answer(query: str, context_chunks: list, policy_id=None) -> str:
+    """Fallback without Gemini: BM25 search over the policy's cached index."""
+    best_chunks = [chunk for _, chunk in retrieval.search(query, context_chunks or [], policy_id, k=2)]
+
+    if best_chunks:
+        context_text = "\n\n".join(best_chunks)
+        return f"*(AI Offline Mode)* I found this in the policy: \n\n{context_text}\n\n(Note: For better conversational replies, please add GEMINI_API_KEY)"
+    return "*(AI Offline Mode)* I'm sorry, I couldn't find a direct answer in the policy. Without an API key, my reasoning is limited."
+
+
+def _build_chat_prompt(query: str, context_chunks: list, chat_history: list = None) -> str:
+    # Pack the most relevant chunks / most recent turns into the configured token budgets
+    chunks = context_packer.pack_chunks(query, context_chunks or [], settings.LLM_CONTEXT_TOKEN_BUDGET)
+    context = "\n\n".join(chunks)
     history_list = []
-    for h in (chat_history or [])[-5:]:
+    for h in context_packer.pack_history(chat_history, settings.LLM_HISTORY_TOKEN_BUDGET):
         role = h.get('role', 'user') # type: ignore
         content = h.get('content', '') # type: ignore
         history_list.append(f"{role}: {content}")
     history_text = "\n".join(history_list)
-    
+
     if context:
-        prompt = f"""You are Mitr, an AI policy assistant. Answer accurately based ONLY on this context:
+        return f"""You are Mitr, an AI policy assistant. Answer accurately based ONLY on this context:
 {context}
 
 Recent History:
@@ -110,8 +61,7 @@ Recent History:
 
 User: {query}
 Assistant:"""
-    else:
-        prompt = f"""You are Mitr, an expert AI policy assistant for Indian citizens. 
+    return f"""You are Mitr, an expert AI policy assistant for Indian citizens. 
 You have extensive knowledge of government schemes, policies, laws, and administrative procedures.
 Please answer the user's question accurately, comprehensively, and in a simple, easy-to-understand manner.
 
@@ -121,17 +71,43 @@ Recent History:
 User: {query}
 Assistant:"""
 
+
+async def chat_with_context(query: str, context_chunks: list, chat_history: list = None, policy_id=None) -> str:
+    """RAG-based chat with policy context using Gemini."""
+    if not model:
+        return _offline_answer(query, context_chunks, policy_id)
+
+    prompt = _build_chat_prompt(query, context_chunks, chat_history)
     try:
-        response = generate_content_with_fallback(prompt)
+        response = await generate_content_with_fallback(prompt, endpoint="chat")
         return response.text.strip()
     except Exception as e:
         return f"Gemini Error: {str(e)}"
 
 
+async def chat_with_context_stream(query: str, context_chunks: list, chat_history: list = None, policy_id=None):
+    """Same as ``chat_with_context`` but yields text pieces as Gemini produces them.
+    Gemini failures propagate (possibly after some pieces) so the caller can tell a
+    broken stream from a complete answer.
+    """
+    if not model:
+        yield _offline_answer(query, context_chunks, policy_id)
+        return
+
+    prompt = _build_chat_prompt(query, context_chunks, chat_history)
+    async for piece in gemini.stream(prompt, endpoint="chat"):
+        yield piece
+
+
 async def translate_text(text: str, target_language: str) -> str:
-    """Translate text with high-quality Gemini effort and multiple fallbacks."""
+    """Translate text with high-quality Gemini effort and multiple fallbacks.
+    Each backend's result is cached (see translation_cache), so repeat requests skip it.
+    """
     # 1. Gemini (Best Quality - High Fidelity)
     if model:
+        cached = await translation_cache.get(text, target_language, "gemini")
+        if cached is not None:
+            return cached
         try:
             prompt = (
                 f"You are a professional government policy translator. "
@@ -140,21 +116,34 @@ async def translate_text(text: str, target_language: str) -> str:
                 f"Return ONLY the translated text.\n\n"
                 f"Text:\n{text[:3000]}"
             )
-            response = generate_content_with_fallback(prompt)
-            return response.text.strip()
+            response = await generate_content_with_fallback(prompt, endpoint="translate")
+            translated = response.text.strip()
+            await translation_cache.put(text, target_language, "gemini", translated)
+            return translated
         except Exception:
             pass
 
     # 2. Argos Translate (User's preferred "old code" for Hindi)
-    if target_language == "hi" and _hindi_translator:
+    if target_language == "hi":
+        cached = await translation_cache.get(text, target_language, "argos")
+        if cached is not None:
+            return cached
         try:
-            return _hindi_translator.translate(text)
+            translated = await _argos_translate(text)
+            if translated:
+                await translation_cache.put(text, target_language, "argos", translated)
+                return translated
         except: pass
 
     # 3. Deep Translator (Free web-based fallback)
     if GoogleTranslator is not None:
+        cached = await translation_cache.get(text, target_language, "google")
+        if cached is not None:
+            return cached
         try:
-            return GoogleTranslator(source='auto', target=target_language).translate(text[:4500])
+            translated = await asyncio.to_thread(GoogleTranslator(source='auto', target=target_language).translate, text[:4500])
+            await translation_cache.put(text, target_language, "google", translated)
+            return translated
         except Exception as e:
             return f"Translation error: {e}"
     else:
@@ -181,7 +170,7 @@ Policy B:
 RESPOND WITH ONLY VALID JSON."""
 
     try:
-        response = generate_content_with_fallback(prompt)
+        response = await generate_content_with_fallback(prompt, endpoint="compare")
         response_text = response.text.strip()
         if response_text.startswith("```"):
             lines = response_text.split("\n")
@@ -205,7 +194,7 @@ Policy:
 RESPOND WITH ONLY A JSON ARRAY OF STRINGS."""
 
     try:
-        response = generate_content_with_fallback(prompt)
+        response = await generate_content_with_fallback(prompt, endpoint="recommendations")
         response_text = response.text.strip()
         if response_text.startswith("```"):
             lines = response_text.split("\n")
@@ -215,46 +204,211 @@ RESPOND WITH ONLY A JSON ARRAY OF STRINGS."""
         return ["No recommendations available."]
 
 
+def _parse_json(response_text: str):
+    """Parse a JSON reply, tolerating ```json fences around it."""
+    response_text = response_text.strip()
+    if response_text.startswith("```"):
+        lines = response_text.split("\n")
+        response_text = "\n".join(lines[1:-1])
+    if response_text.startswith("json"):
+        response_text = response_text[4:].strip()
+    return json.loads(response_text)
+
+
+ANALYSIS_KEYS = """- "summary": A concise summary of the policy (around 100-150 words).
+- "simplified": A very simple, plain-English explanation for a 10-year-old.
+- "category": The best fitting category (e.g., Health, Education, Finance, Agriculture, Infrastructure, Social Welfare, Environment, Technology, Defense, or Other).
+- "hindi_summary": A high-quality translation of the summary in Hindi."""
+
+CLAUSE_KEYS = """- "clauses": An array of objects, where each object has:
+    - "clause_number": Integer (1, 2, 3...)
+    - "clause_text": The original or slightly compressed text of a key clause.
+    - "explanation": Simple plain-English explanation of this clause.
+- "difficulty_score": A number out of 100 estimating how hard it is to read (higher = harder)."""
+
+
+async def _local_analysis(text: str) -> dict:
+    """Slow local (BART) analysis; runs from upload jobs, so it queues for a local_model slot.
+    In sidecar mode the models live in the inference sidecar, not in this worker.
+    """
+    async with admission.local_model.admit(background=True):
+        if settings.INFERENCE_MODE == "sidecar":
+            return await inference_client.analyze_policy(text)
+        from . import summarizer
+        return await summarizer.analyze_policy(text)
+
+
+async def _fallback_analysis(text: str) -> dict:
+    """Local analysis standing in for a failed Gemini one - flagged so it isn't reused."""
+    return {**await _local_analysis(text), "degraded": True}
+
+
 async def analyze_policy_gemini(text: str) -> dict:
-    """Analyze policy using Gemini (much faster than local BART)."""
+    """Analyze policy using Gemini (much faster than local BART).
+    Documents larger than LLM_ANALYSIS_TOKEN_BUDGET go through map-reduce analysis.
+    ``degraded`` is set when part of it fell back after a failure.
+    """
     start = time.time()
     
     if not model:
         # Fallback to the slow local summarizer if no API key
-        from . import summarizer
-        return await summarizer.analyze_policy(text)
-        
+        return await _local_analysis(text)
+
+    if settings.LLM_MAP_REDUCE and context_packer.count_tokens(text) > settings.LLM_ANALYSIS_TOKEN_BUDGET:
+        try:
+            return await _analyze_map_reduce(text, start)
+        except Exception as e:
+            print(f"[LLM] Map-reduce analysis failed: {e}. Falling back to local model.")
+            return await _fallback_analysis(text)
+
     prompt = f"""You are an expert legal AI assistant. Analyze the following government policy and return a JSON object with EXACTLY these keys:
-- "summary": A concise summary of the policy (around 100-150 words).
-- "simplified": A very simple, plain-English explanation for a 10-year-old.
-- "category": The best fitting category (e.g., Health, Education, Finance, Agriculture, Infrastructure, Social Welfare, Environment, Technology, Defense, or Other).
-- "hindi_summary": A high-quality translation of the summary in Hindi.
-- "clauses": An array of objects, where each object has:
-    - "clause_number": Integer (1, 2, 3...)
-    - "clause_text": The original or slightly compressed text of a key clause.
-    - "explanation": Simple plain-English explanation of this clause.
-- "difficulty_score": A number out of 100 estimating how hard it is to read (higher = harder).
+{ANALYSIS_KEYS}
+{CLAUSE_KEYS}
 
 Analyze this policy text:
-{text[:15000]}
+{context_packer.truncate_to_budget(text, settings.LLM_ANALYSIS_TOKEN_BUDGET)}
 
 RESPOND WITH ONLY VALID JSON. Do not include markdown formatting or backticks around the json.
 """
     try:
-        response = generate_content_with_fallback(prompt)
-        response_text = response.text.strip()
-        if response_text.startswith("```"):
-            lines = response_text.split("\n")
-            response_text = "\n".join(lines[1:-1])
-        if response_text.startswith("json"):
-            response_text = response_text[4:].strip()
-            
-        data = json.loads(response_text)
+        response = await generate_content_with_fallback(prompt, endpoint="analyze")
+        data = _parse_json(response.text)
         data["ai_confidence"] = 0.95
         data["processing_time"] = round(time.time() - start, 2)
         return data
     except Exception as e:
         print(f"[LLM] Gemini analysis failed: {e}. Falling back to local model.")
-        from . import summarizer
-        return await summarizer.analyze_policy(text)
+        return await _fallback_analysis(text)
+
+
+# ── Map-reduce analysis for long documents ──
+
+def _paragraph_clauses(section: str) -> list:
+    """Model-free clauses (one per paragraph) for a section whose analysis failed."""
+    paragraphs = [p.strip() for p in section.split("\n\n") if len(p.strip()) > 30]
+    return [{"clause_text": p[:500], "explanation": ""} for p in paragraphs]
+
+
+async def _analyze_section(section: str, index: int, total: int, limit: asyncio.Semaphore) -> dict:
+    """Map step: summary, clauses, category and difficulty of one section."""
+    prompt = f"""You are an expert legal AI assistant. This is section {index + 1} of {total} of a government policy.
+Return a JSON object with EXACTLY these keys:
+- "summary": A concise summary of this section (around 60-100 words).
+- "category": The best fitting category for the policy (e.g., Health, Education, Finance, Agriculture, Infrastructure, Social Welfare, Environment, Technology, Defense, or Other).
+{CLAUSE_KEYS}
+
+Section text:
+{section}
+
+RESPOND WITH ONLY VALID JSON. Do not include markdown formatting or backticks around the json.
+"""
+    async with limit:
+        for attempt in range(2):
+            try:
+                response = await generate_content_with_fallback(prompt, endpoint="analyze")
+                data = _parse_json(response.text)
+                if isinstance(data, dict):
+                    return data
+            except Exception as e:
+                print(f"[LLM] Section {index + 1}/{total} analysis failed (attempt {attempt + 1}): {e}")
+    # Keep the section's content even when the model could not analyse it
+    return {"summary": context_packer.truncate_to_budget(section, 150), "clauses": _paragraph_clauses(section), "failed": True}
+
+
+async def _reduce_summaries(summaries: list) -> str:
+    """Collapse section summaries until they fit the analysis budget (hierarchical reduce)."""
+    joined = "\n\n".join(summaries)
+    if len(summaries) <= 1 or context_packer.count_tokens(joined) <= settings.LLM_ANALYSIS_TOKEN_BUDGET:
+        return joined
+    groups = context_packer.split_sections(joined, settings.LLM_ANALYSIS_TOKEN_BUDGET)
+
+    async def condense(group: str) -> str:
+        prompt = f"""Condense these consecutive section summaries of a government policy into one summary of about 150 words.
+Keep every obligation, benefit, eligibility rule, deadline and amount.
+
+{group}
+
+Return ONLY the summary text."""
+        try:
+            response = await generate_content_with_fallback(prompt, endpoint="analyze")
+            return response.text.strip()
+        except Exception:
+            return context_packer.truncate_to_budget(group, 300)
+
+    condensed = await asyncio.gather(*(condense(g) for g in groups))
+    if len(condensed) >= len(summaries):
+        return "\n\n".join(condensed)
+    return await _reduce_summaries(list(condensed))
+
+
+async def _analyze_map_reduce(text: str, start: float) -> dict:
+    """Split → analyse sections concurrently → merge into the regular analysis shape."""
+    sections = context_packer.split_sections(text, settings.LLM_SECTION_TOKEN_BUDGET)
+    limit = asyncio.Semaphore(settings.LLM_MAP_CONCURRENCY)
+    print(f"[LLM] Map-reduce analysis: {len(sections)} sections")
+    results = await asyncio.gather(
+        *(_analyze_section(s, i, len(sections), limit) for i, s in enumerate(sections))
+    )
+
+    # Clauses: all sections, in document order, renumbered
+    clauses = []
+    for result in results:
+        for clause in result.get("clauses") or []:
+            if isinstance(clause, dict) and clause.get("clause_text"):
+                clauses.append({
+                    "clause_number": len(clauses) + 1,
+                    "clause_text": clause.get("clause_text", ""),
+                    "explanation": clause.get("explanation", ""),
+                })
+
+    # Difficulty: section scores weighted by section length
+    weighted, weight = 0.0, 0
+    for section, result in zip(sections, results):
+        try:
+            score = float(result.get("difficulty_score"))
+        except (TypeError, ValueError):
+            continue
+        size = context_packer.count_tokens(section)
+        weighted += score * size
+        weight += size
+    difficulty = round(weighted / weight) if weight else 50
+
+    # Category: majority vote of sections, overridden by the reduce step if it answers
+    votes = {}
+    for result in results:
+        if result.get("category"):
+            votes[result["category"]] = votes.get(result["category"], 0) + 1
+    category = max(votes, key=votes.get) if votes else "Other"
+
+    summaries = [f"Section {i + 1}: {r.get('summary', '')}" for i, r in enumerate(results) if r.get("summary")]
+    merged = await _reduce_summaries(summaries)
+    prompt = f"""You are an expert legal AI assistant. Below are summaries of all sections of one government policy.
+Return a JSON object with EXACTLY these keys:
+{ANALYSIS_KEYS}
+
+Section summaries:
+{merged}
 
+RESPOND WITH ONLY VALID JSON. Do not include markdown formatting or backticks around the json.
+"""
+    degraded = any(r.get("failed") for r in results)
+    try:
+        response = await generate_content_with_fallback(prompt, endpoint="analyze")
+        overview = _parse_json(response.text)
+    except Exception as e:
+        print(f"[LLM] Reduce step failed: {e}. Using merged section summaries.")
+        overview = {"summary": merged, "simplified": merged, "hindi_summary": ""}
+        degraded = True
+
+    return {
+        "summary": overview.get("summary", merged),
+        "simplified": overview.get("simplified", ""),
+        "category": overview.get("category") or category,
+        "hindi_summary": overview.get("hindi_summary", ""),
+        "clauses": clauses,
+        "difficulty_score": difficulty,
+        "ai_confidence": 0.9 if not any(r.get("failed") for r in results) else 0.75,
+        "processing_time": round(time.time() - start, 2),
+        "sections": len(sections),
+        "degraded": degraded,
+    }
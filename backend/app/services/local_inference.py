@@ -0,0 +1,84 @@
+"""
+Local inference executor - runs BART-CNN, BART-MNLI and Argos off the event loop.
+All local model work goes through one dedicated, fixed-size thread pool
+(LOCAL_INFERENCE_THREADS), separate from asyncio's default executor, so a
+long forward pass never blocks request handling and never starves other
+to_thread users (SQLite caches, PDF extraction). Queue wait and run times are
+tracked for /admin/metrics.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
+
+_executor = None
+_lock = threading.Lock()
+stats = {"submitted": 0, "completed": 0, "errors": 0, "pending": 0, "active": 0,
+         "total_queue_wait": 0.0, "max_queue_wait": 0.0, "total_run_time": 0.0}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.LOCAL_INFERENCE_THREADS,
+            thread_name_prefix="local-inference",
+        )
+    return _executor
+
+
+async def run(fn, *args):
+    """Run blocking ``fn(*args)`` on the local inference pool and await its result."""
+    queued_at = time.monotonic()
+    with _lock:
+        stats["submitted"] += 1
+        stats["pending"] += 1
+
+    def call():
+        started = time.monotonic()
+        wait = started - queued_at
+        with _lock:
+            stats["pending"] -= 1
+            stats["active"] += 1
+            stats["total_queue_wait"] += wait
+            stats["max_queue_wait"] = max(stats["max_queue_wait"], wait)
+        try:
+            return fn(*args)
+        finally:
+            with _lock:
+                stats["active"] -= 1
+                stats["total_run_time"] += time.monotonic() - started
+
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(_get_executor(), call)
+    except Exception:
+        with _lock:
+            stats["errors"] += 1
+        raise
+    with _lock:
+        stats["completed"] += 1
+    return result
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def metrics() -> dict:
+    started = stats["submitted"] - stats["pending"]
+    return {
+        "threads": settings.LOCAL_INFERENCE_THREADS,
+        "torch_threads": settings.TORCH_NUM_THREADS or None,
+        "submitted": stats["submitted"],
+        "completed": stats["completed"],
+        "errors": stats["errors"],
+        "queue_depth": stats["pending"],
+        "active": stats["active"],
+        "avg_queue_wait_ms": round(stats["total_queue_wait"] / started * 1000) if started else 0,
+        "max_queue_wait_ms": round(stats["max_queue_wait"] * 1000),
+        "avg_run_ms": round(stats["total_run_time"] / started * 1000) if started else 0,
+    }
@@ -0,0 +1,207 @@
+"""
+Model router - picks which Gemini model serves a call.
+Each model keeps a sliding window of recent outcomes and latencies, a circuit
+breaker and client-side token buckets matching its RPM/TPM quota. Models are
+tried in priority order; one whose circuit is open (quota exhausted or error
+rate too high) or whose buckets are empty is skipped, so callers go straight
+to the fallback instead of paying for a failed round trip first.
+"""
+import asyncio
+import time
+from collections import deque
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class QuotaWaitExceeded(Exception):
+    """Every usable model is rate limited for longer than the router may wait."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used for TPM accounting."""
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    """Refills ``rate_per_minute`` tokens per minute up to ``capacity``; may run into debt."""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self._last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def wait_time(self, n: float) -> float:
+        """Seconds until ``n`` tokens are available (0 if they are now)."""
+        self._refill()
+        n = min(n, self.capacity)
+        return 0.0 if self.tokens >= n else (n - self.tokens) / self.rate
+
+    def consume(self, n: float):
+        self._refill()
+        self.tokens -= n
+
+
+class ModelState:
+    """Health, latency and quota state of one model."""
+
+    def __init__(self, name: str, model, rpm: int, tpm: int, window: int = 50,
+                 error_threshold: float = 0.5, min_samples: int = 5, cooldown: float = 30.0):
+        self.name = name
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.outcomes = deque(maxlen=window)
+        self.latencies = deque(maxlen=window)
+        self.error_threshold = error_threshold
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.circuit = CLOSED
+        self.opened_at = 0.0
+        self.open_reason = ""
+        self.probing = False
+        self.calls = 0
+        self.failures = 0
+
+    # ── circuit breaker ──
+
+    def allows_call(self) -> bool:
+        if self.circuit == CLOSED:
+            return True
+        if self.circuit == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self.circuit = HALF_OPEN
+        # Half-open: let a single probe through
+        return self.circuit == HALF_OPEN and not self.probing
+
+    def _open(self, reason: str):
+        self.circuit = OPEN
+        self.opened_at = time.monotonic()
+        self.open_reason = reason
+        print(f"[Router] Circuit OPEN for {self.name}: {reason}")
+
+    def error_rate(self) -> float:
+        return (self.outcomes.count(False) / len(self.outcomes)) if self.outcomes else 0.0
+
+    def record_success(self, latency: float, total_tokens: int = 0, estimated_tokens: int = 0):
+        self.outcomes.append(True)
+        self.latencies.append(latency)
+        self.probing = False
+        if total_tokens > estimated_tokens:
+            # Charge the output tokens we could not know up front
+            self.tokens.consume(total_tokens - estimated_tokens)
+        if self.circuit != CLOSED:
+            print(f"[Router] Circuit CLOSED for {self.name}")
+            self.circuit = CLOSED
+
+    def record_failure(self, quota_error: bool, reason: str):
+        self.outcomes.append(False)
+        self.failures += 1
+        self.probing = False
+        if quota_error:
+            self._open(f"quota: {reason[:120]}")
+        elif self.circuit == HALF_OPEN:
+            self._open(f"probe failed: {reason[:120]}")
+        elif len(self.outcomes) >= self.min_samples and self.error_rate() >= self.error_threshold:
+            self._open(f"error rate {self.error_rate():.0%}")
+
+    # ── quota ──
+
+    def quota_wait(self, tokens: int) -> float:
+        return max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def reserve(self, tokens: int):
+        self.calls += 1
+        self.requests.consume(1)
+        self.tokens.consume(tokens)
+        if self.circuit == HALF_OPEN:
+            self.probing = True
+
+    def latency_percentile(self, pct: float):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(pct / 100.0 * len(ordered)))]
+
+    def state(self) -> dict:
+        return {
+            "model": self.name,
+            "circuit": self.circuit,
+            "open_reason": self.open_reason if self.circuit != CLOSED else "",
+            "open_for_s": round(time.monotonic() - self.opened_at, 1) if self.circuit != CLOSED else 0,
+            "calls": self.calls,
+            "failures": self.failures,
+            "recent_error_rate": round(self.error_rate(), 3),
+            "latency_p50_ms": _ms(self.latency_percentile(50)),
+            "latency_p95_ms": _ms(self.latency_percentile(95)),
+            "rpm_available": round(self.requests.tokens, 1),
+            "tpm_available": round(self.tokens.tokens),
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000)
+
+
+class ModelRouter:
+    """Chooses a model per call, in priority order."""
+
+    def __init__(self, models: list, max_quota_wait: float = 10.0):
+        self.models = [m for m in models if m.model is not None]
+        self.max_quota_wait = max_quota_wait
+        self.routed = {m.name: 0 for m in self.models}
+
+    async def acquire(self, tokens: int, exclude=(), wait: bool = True) -> ModelState:
+        """Pick the first model whose circuit allows a call and whose quota has room.
+
+        If every healthy model is rate limited, reserves on the one that frees up
+        first and waits for its turn; the reservation puts the bucket into debt,
+        so concurrent waiters queue behind each other instead of all waking at
+        once. Raises QuotaWaitExceeded if that turn is more than
+        ``max_quota_wait`` away. If every circuit is open, the lowest-priority
+        model is probed anyway. Returns None when nothing is left, or when
+        ``wait=False`` and no model is ready right now.
+        """
+        candidates = [m for m in self.models if m.name not in exclude]
+        if not candidates:
+            return None
+        healthy = [m for m in candidates if m.allows_call()]
+        if not healthy:
+            if not wait:
+                return None
+            chosen = candidates[-1]
+        else:
+            waits = [(m.quota_wait(tokens), m) for m in healthy]
+            ready = [m for delay, m in waits if delay == 0]
+            if ready:
+                chosen = ready[0]
+            elif not wait:
+                return None
+            else:
+                delay, chosen = min(waits, key=lambda item: item[0])
+                if delay > self.max_quota_wait:
+                    raise QuotaWaitExceeded(
+                        f"Rate limited: next {chosen.name} slot in {delay:.1f}s "
+                        f"(max wait {self.max_quota_wait:.0f}s)"
+                    )
+                # Reserve first, then wait out the debt
+                chosen.reserve(tokens)
+                self.routed[chosen.name] += 1
+                await asyncio.sleep(delay)
+                return chosen
+        chosen.reserve(tokens)
+        self.routed[chosen.name] += 1
+        return chosen
+
+    def get(self, name: str):
+        return next((m for m in self.models if m.name == name), None)
+
+    def state(self) -> dict:
+        return {
+            "models": [m.state() for m in self.models],
+            "routed": dict(self.routed),
+        }
@@ -0,0 +1,91 @@
+"""
+Lexical retrieval - BM25 over a per-policy inverted index.
+Used when Gemini is not configured (offline chat). The index for a policy is
+built once from its context chunks and cached by policy_id; a fingerprint of
+the chunks guards against serving an index built from stale content, and
+deleting a policy drops its index.
+"""
+import hashlib
+import math
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.context_packer import B, K1, tokenize
+
+
+class BM25Index:
+    """Inverted index (term -> [(chunk, term frequency)]) with BM25 scoring."""
+
+    def __init__(self, chunks: list):
+        self.chunks = list(chunks)
+        self.postings = {}
+        self.lengths = []
+        for i, chunk in enumerate(self.chunks):
+            counts = {}
+            words = tokenize(chunk)
+            for w in words:
+                counts[w] = counts.get(w, 0) + 1
+            for w, tf in counts.items():
+                self.postings.setdefault(w, []).append((i, tf))
+            self.lengths.append(len(words))
+        self.avg_len = (sum(self.lengths) / len(self.lengths) or 1.0) if self.lengths else 1.0
+
+    def idf(self, term: str) -> float:
+        n = len(self.chunks)
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 5) -> list:
+        """Top ``k`` (score, chunk) pairs with a positive score, best first."""
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for i, tf in postings:
+                norm = K1 * (1 - B + B * self.lengths[i] / self.avg_len)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [(score, self.chunks[i]) for i, score in best]
+
+
+def _fingerprint(chunks: list) -> str:
+    digest = hashlib.sha1()
+    for chunk in chunks:
+        digest.update(chunk.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+_indexes = TTLCache(maxsize=settings.RETRIEVAL_INDEX_CACHE_SIZE, ttl=settings.RETRIEVAL_INDEX_CACHE_TTL)
+stats = {"builds": 0, "stale": 0}
+
+
+def get_index(policy_id, chunks: list) -> BM25Index:
+    """Cached index for the policy, rebuilt if its chunks changed."""
+    if not policy_id:
+        return BM25Index(chunks)
+    fingerprint = _fingerprint(chunks)
+    cached = _indexes.get(policy_id)
+    if cached is not None:
+        if cached[0] == fingerprint:
+            return cached[1]
+        stats["stale"] += 1
+    index = BM25Index(chunks)
+    stats["builds"] += 1
+    _indexes.set(policy_id, (fingerprint, index))
+    return index
+
+
+def search(query: str, chunks: list, policy_id=None, k: int = 5) -> list:
+    if not chunks:
+        return []
+    return get_index(policy_id, chunks).search(query, k)
+
+
+def invalidate(policy_id):
+    _indexes.pop(policy_id)
+
+
+def metrics() -> dict:
+    return {**_indexes.stats(), **stats}
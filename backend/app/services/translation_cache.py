@@ -0,0 +1,93 @@
+"""
+Translation cache - content-addressed, two tiers.
+Entries are keyed on (sha256 of the normalized text, target language, backend),
+so a Gemini translation is never mistaken for an Argos or Google one. Lookups
+hit an in-memory LRU first, then a SQLite file that survives restarts and is
+trimmed (least recently used first) once it grows past TRANSLATION_CACHE_MAX_MB.
+"""
+import asyncio
+import sqlite3
+import time
+from app.core.cache import SQLiteLRU, TTLCache, text_key
+from app.core.config import settings
+
+_SCHEMA = """
+    create table if not exists translations (
+        text_hash text not null,
+        target_language text not null,
+        backend text not null,
+        translation text not null,
+        size integer not null,
+        last_used real not null,
+        primary key (text_hash, target_language, backend)
+    );
+"""
+
+
+class TranslationCache:
+    def __init__(self, path: str, memory_items: int, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._memory = TTLCache(maxsize=memory_items, ttl=None)
+        self._disk = SQLiteLRU(path, "translations", ("text_hash", "target_language", "backend"), _SCHEMA, max_bytes)
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+
+    def _get_disk(self, conn: sqlite3.Connection, key: tuple):
+        row = conn.execute(
+            "select translation from translations where text_hash=? and target_language=? and backend=?",
+            key,
+        ).fetchone()
+        if row:
+            self._disk.touch(conn, key)
+        return row[0] if row else None
+
+    def _put_disk(self, conn: sqlite3.Connection, key: tuple, translation: str):
+        conn.execute(
+            "insert or replace into translations values (?, ?, ?, ?, ?, ?)",
+            (*key, translation, len(translation.encode("utf-8")), time.time()),
+        )
+        self._disk.trim(conn)
+
+    async def get(self, text: str, target_language: str, backend: str):
+        key = (text_key(text), target_language, backend)
+        cached = self._memory.get(key)
+        if cached is not None:
+            self.stats["memory_hits"] += 1
+            return cached
+        try:
+            cached = await asyncio.to_thread(self._disk.run, self._get_disk, key)
+        except sqlite3.Error as e:
+            print(f"[TranslationCache] Read failed: {e}")
+            cached = None
+        if cached is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["disk_hits"] += 1
+        self._memory.set(key, cached)
+        return cached
+
+    async def put(self, text: str, target_language: str, backend: str, translation: str):
+        if not translation:
+            return
+        key = (text_key(text), target_language, backend)
+        self._memory.set(key, translation)
+        try:
+            await asyncio.to_thread(self._disk.run, self._put_disk, key, translation)
+            self.stats["writes"] += 1
+        except sqlite3.Error as e:
+            print(f"[TranslationCache] Write failed: {e}")
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "evicted": self._disk.evicted,
+            "memory_items": len(self._memory),
+            "disk_bytes": self._disk.last_size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+cache = TranslationCache(
+    path=settings.TRANSLATION_CACHE_PATH,
+    memory_items=settings.TRANSLATION_CACHE_MEMORY_ITEMS,
+    max_bytes=settings.TRANSLATION_CACHE_MAX_MB * 1024 * 1024,
+)
@@ -0,0 +1,136 @@
+"""
+Benchmark: PyTorch vs int8 ONNX Runtime for the local BART models on CPU.
+
+Summarizes and classifies the same documents with both backends and prints
+median latency per document, plus ROUGE-1/2/L F1 of the ONNX summaries against
+the PyTorch ones (how much quality quantization costs) and how often the two
+classifiers pick the same category.
+
+Documents are plain-text files passed with --docs (e.g. extracted policies);
+without them, synthetic documents of 1 and 3 chunks are used.
+
+Usage (from backend/, after scripts/export_onnx.py):
+    python benchmarks/bench_onnx.py
+    python benchmarks/bench_onnx.py --docs samples/*.txt --runs 3 --threads 4
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_summarizer import make_document  # noqa: E402
+
+
+# ── ROUGE (F1, whitespace/punctuation tokenized, no stemming) ──
+
+def _tokens(text: str) -> list:
+    return re.findall(r"\w+", text.lower())
+
+
+def _ngrams(tokens: list, n: int) -> dict:
+    counts = {}
+    for i in range(len(tokens) - n + 1):
+        gram = tuple(tokens[i:i + n])
+        counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+def _f1(overlap: int, candidate: int, reference: int) -> float:
+    if not overlap:
+        return 0.0
+    precision, recall = overlap / candidate, overlap / reference
+    return 2 * precision * recall / (precision + recall)
+
+
+def rouge_n(candidate: str, reference: str, n: int) -> float:
+    cand, ref = _ngrams(_tokens(candidate), n), _ngrams(_tokens(reference), n)
+    overlap = sum(min(c, ref.get(g, 0)) for g, c in cand.items())
+    return _f1(overlap, sum(cand.values()), sum(ref.values()))
+
+
+def rouge_l(candidate: str, reference: str) -> float:
+    cand, ref = _tokens(candidate), _tokens(reference)
+    previous = [0] * (len(ref) + 1)
+    for c in cand:
+        current = [0]
+        for j, r in enumerate(ref):
+            current.append(previous[j] + 1 if c == r else max(previous[j + 1], current[j]))
+        previous = current
+    return _f1(previous[-1], len(cand), len(ref))
+
+
+# ── Benchmark ──
+
+def timed(fn, runs: int):
+    times, result = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", nargs="*", default=[], help="plain-text documents to summarize")
+    parser.add_argument("--runs", type=int, default=3, help="runs per document (median is reported)")
+    parser.add_argument("--threads", type=int, default=0, help="CPU threads for both backends (0 = defaults)")
+    args = parser.parse_args()
+
+    # CPU only: the ONNX backend targets nodes without a GPU
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    if args.threads:
+        os.environ["TORCH_NUM_THREADS"] = os.environ["ONNX_INTRA_OP_THREADS"] = str(args.threads)
+    from app.services import onnx_backend, summarizer
+
+    backends = {
+        "torch": (summarizer.load_torch_summarizer(), summarizer.load_torch_classifier()),
+        "onnx": (onnx_backend.load_summarizer(), onnx_backend.load_classifier()),
+    }
+    if args.docs:
+        documents = {Path(d).name: Path(d).read_text(encoding="utf-8") for d in args.docs}
+    else:
+        documents = {f"synthetic-{n}chunk": make_document(n, summarizer.CHUNK_SIZE) for n in (1, 3)}
+
+    latency = {name: {"summarize": [], "classify": []} for name in backends}
+    summaries = {name: {} for name in backends}
+    categories = {name: {} for name in backends}
+    for name, ((model, tokenizer), classifier) in backends.items():
+        # Warm-up (first call pays for lazy initialisation / graph optimisation)
+        summarizer._generate([make_document(1, summarizer.CHUNK_SIZE)], model, tokenizer, 1)
+        for doc, text in documents.items():
+            chunks = summarizer._chunks(text.strip(), summarizer.MAX_CHUNKS)
+            seconds, parts = timed(lambda: summarizer._generate(chunks, model, tokenizer, len(chunks)), args.runs)
+            latency[name]["summarize"].append(seconds)
+            summaries[name][doc] = summarizer._join(parts)
+            seconds, result = timed(lambda: classifier(text[:512], summarizer.POLICY_CATEGORIES, multi_label=False), args.runs)
+            latency[name]["classify"].append(seconds)
+            categories[name][doc] = result["labels"][0]
+
+    print(f"{len(documents)} documents, {args.runs} runs each, threads: {args.threads or 'default'}")
+    print(f"{'backend':>8}  {'summarize (s)':>13}  {'classify (s)':>12}")
+    for name in backends:
+        print(f"{name:>8}  {statistics.mean(latency[name]['summarize']):>13.2f}  {statistics.mean(latency[name]['classify']):>12.3f}")
+    speedup = statistics.mean(latency["torch"]["summarize"]) / statistics.mean(latency["onnx"]["summarize"])
+    print(f"summarize speedup: {speedup:.2f}x")
+
+    print(f"\n{'document':<30}  {'ROUGE-1':>7}  {'ROUGE-2':>7}  {'ROUGE-L':>7}  {'same category':>13}")
+    scores = []
+    for doc in documents:
+        candidate, reference = summaries["onnx"][doc], summaries["torch"][doc]
+        row = (rouge_n(candidate, reference, 1), rouge_n(candidate, reference, 2), rouge_l(candidate, reference))
+        scores.append(row)
+        same = categories["onnx"][doc] == categories["torch"][doc]
+        print(f"{doc[:30]:<30}  {row[0]:>7.3f}  {row[1]:>7.3f}  {row[2]:>7.3f}  {'yes' if same else 'no':>13}")
+    means = [statistics.mean(s[i] for s in scores) for i in range(3)]
+    agreement = sum(categories["onnx"][d] == categories["torch"][d] for d in documents) / len(documents)
+    print(f"{'mean':<30}  {means[0]:>7.3f}  {means[1]:>7.3f}  {means[2]:>7.3f}  {agreement:>12.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark: sequential vs batched BART summarization on CPU.
+
+Summarizes synthetic policy documents of 1, 3 and 10 chunks (3000 chars each)
+once with batch_size=1 (one generate() call per chunk, the old behaviour) and
+once batched, and prints the wall-clock time of each.
+
+Usage (from backend/, with the models in models/bart-summarizer):
+    python benchmarks/bench_summarizer.py
+    python benchmarks/bench_summarizer.py --chunks 1 3 10 --runs 3 --batch-size 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+PARAGRAPH = (
+    "The scheme provides financial assistance to eligible small and marginal farmers "
+    "holding cultivable land of up to two hectares. An amount of six thousand rupees per "
+    "year is transferred directly to the bank accounts of beneficiaries in three equal "
+    "instalments. State governments are responsible for identifying beneficiaries and "
+    "verifying land records, while the central government releases the funds. "
+)
+
+
+def make_document(chunks: int, chunk_size: int) -> str:
+    text = ""
+    while len(text) < chunks * chunk_size:
+        text += PARAGRAPH
+    return text[:chunks * chunk_size]
+
+
+def timed(fn, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1, 3, 10])
+    parser.add_argument("--runs", type=int, default=3, help="runs per case (median is reported)")
+    parser.add_argument("--batch-size", type=int, default=0, help="batched run size (0 = all chunks in one batch)")
+    parser.add_argument("--threads", type=int, default=0, help="torch CPU threads (0 = torch default)")
+    args = parser.parse_args()
+
+    # CPU only, so numbers are comparable across machines with and without a GPU
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    import torch
+    from app.services import summarizer
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    model, tokenizer = summarizer.get_summarizer()
+    # Warm-up (first call pays for lazy initialisation)
+    summarizer.summarize_text(make_document(1, summarizer.CHUNK_SIZE), batch_size=1)
+
+    print(f"torch {torch.__version__}, {torch.get_num_threads()} threads, device {summarizer.DEVICE}")
+    print(f"{'chunks':>6}  {'sequential (s)':>14}  {'batched (s)':>11}  {'batch':>5}  {'speedup':>7}")
+    for n in args.chunks:
+        text = make_document(n, summarizer.CHUNK_SIZE)
+        batch = args.batch_size or n
+        sequential = timed(lambda: summarizer.summarize_text(text, batch_size=1, max_chunks=n), args.runs)
+        batched = timed(lambda: summarizer.summarize_text(text, batch_size=batch, max_chunks=n), args.runs)
+        print(f"{n:>6}  {sequential:>14.2f}  {batched:>11.2f}  {batch:>5}  {sequential / batched:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
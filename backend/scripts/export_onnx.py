@@ -0,0 +1,43 @@
+"""
+Export the local BART models to int8-quantized ONNX for INFERENCE_BACKEND=onnx.
+
+Reads models/bart-summarizer and models/classifier and writes the exports to
+ONNX_SUMMARIZER_DIR / ONNX_CLASSIFIER_DIR (by default models/bart-summarizer-onnx
+and models/classifier-onnx). Requires optimum[onnxruntime].
+
+Usage (from backend/):
+    python scripts/export_onnx.py
+    python scripts/export_onnx.py --only summarizer --arch avx512_vnni
+    python scripts/export_onnx.py --no-quantize     # FP32 export, for comparison
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", choices=["summarizer", "classifier"], help="export just one model")
+    parser.add_argument("--arch", default="avx2", choices=["avx2", "avx512", "avx512_vnni", "arm64"],
+                        help="quantization preset for the production CPUs (default: avx2)")
+    parser.add_argument("--no-quantize", action="store_true", help="keep FP32 weights")
+    args = parser.parse_args()
+
+    from app.core.config import settings
+    from app.services import onnx_backend
+    from app.services.summarizer import CLASSIFIER_DIR, SUMMARIZER_DIR
+
+    models = {
+        "summarizer": (SUMMARIZER_DIR, settings.ONNX_SUMMARIZER_DIR, "summarization"),
+        "classifier": (CLASSIFIER_DIR, settings.ONNX_CLASSIFIER_DIR, "classification"),
+    }
+    for name, (source, output, task) in models.items():
+        if args.only and args.only != name:
+            continue
+        onnx_backend.export(source, output, task, quantize=not args.no_quantize, arch=args.arch)
+
+
+if __name__ == "__main__":
+    main()
@@ -197,3 +197,74 @@ begin
   limit match_count;
 end;
 $$;
+
+-- ============================================
+-- POLICY UPLOAD (policy + clauses + activity log in one transaction)
+-- ============================================
+create or replace function create_policy_with_clauses(
+  p_policy jsonb,
+  p_clauses jsonb default '[]'::jsonb,
+  p_activity jsonb default null
+)
+returns jsonb
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_policy policies;
+  v_clauses jsonb;
+begin
+  insert into policies (
+    id, user_id, title, original_text, summary, simplified, hindi_summary,
+    language, category, difficulty_score, ai_confidence, processing_time, privacy_mode
+  )
+  values (
+    coalesce((p_policy->>'id')::uuid, gen_random_uuid()),
+    (p_policy->>'user_id')::uuid,
+    p_policy->>'title',
+    p_policy->>'original_text',
+    p_policy->>'summary',
+    p_policy->>'simplified',
+    p_policy->>'hindi_summary',
+    coalesce(p_policy->>'language', 'en'),
+    p_policy->>'category',
+    coalesce((p_policy->>'difficulty_score')::int, 0),
+    coalesce((p_policy->>'ai_confidence')::float, 0),
+    coalesce((p_policy->>'processing_time')::float, 0),
+    coalesce((p_policy->>'privacy_mode')::boolean, false)
+  )
+  returning * into v_policy;
+
+  with inserted as (
+    insert into clauses (policy_id, clause_number, clause_text, explanation, embedding)
+    select
+      v_policy.id,
+      coalesce((c->>'clause_number')::int, ord::int),
+      coalesce(c->>'clause_text', ''),
+      c->>'explanation',
+      (c->>'embedding')::vector
+    from jsonb_array_elements(coalesce(p_clauses, '[]'::jsonb)) with ordinality as t(c, ord)
+    returning *
+  )
+  select coalesce(jsonb_agg(to_jsonb(inserted) - 'embedding' order by clause_number), '[]'::jsonb)
+    into v_clauses
+  from inserted;
+
+  if p_activity is not null then
+    insert into activity_logs (user_id, policy_id, action_type, details)
+    values (
+      v_policy.user_id,
+      v_policy.id,
+      p_activity->>'action_type',
+      coalesce(p_activity->'details', '{}'::jsonb)
+    );
+  end if;
+
+  return to_jsonb(v_policy) || jsonb_build_object('clauses', v_clauses);
+end;
+$$;
+
+-- Only the backend (service role) may call it: it trusts the user_id it is given
+revoke execute on function create_policy_with_clauses(jsonb, jsonb, jsonb) from public, anon, authenticated;
+grant execute on function create_policy_with_clauses(jsonb, jsonb, jsonb) to service_role;
@@ -22,16 +22,34 @@ export const getProfile = () => api.get('/auth/profile');
 export const updateProfile = (data) => api.put('/auth/profile', data);
 
 // ───── Policies ─────
-export const uploadPolicy = async (file, title, language, privacyMode) => {
+export const uploadPolicy = async (file, title, language, privacyMode, forceReanalyze = false, onProgress) => {
     const formData = new FormData();
     formData.append('file', file);
     formData.append('title', title || '');
     formData.append('language', language || 'en');
     formData.append('privacy_mode', privacyMode ? 'true' : 'false');
+    formData.append('force_reanalyze', forceReanalyze ? 'true' : 'false');
 
-    return api.post('/policies/upload', formData, {
+    // Processing runs as a background job: queue it, then poll until it finishes
+    const { data: job } = await api.post('/policies/upload', formData, {
         headers: { 'Content-Type': 'multipart/form-data' },
     });
+    return waitForJob(job.job_id, onProgress);
+};
+export const getJob = (jobId) => api.get(`/policies/jobs/${jobId}`);
+// Resolves like the old synchronous upload ({ data: policy }); rejects with the job error as detail
+export const waitForJob = async (jobId, onProgress, intervalMs = 1000) => {
+    for (;;) {
+        const { data: job } = await getJob(jobId);
+        if (onProgress) onProgress(job);
+        if (job.status === 'succeeded') return { data: job.result };
+        if (job.status === 'failed') {
+            const err = new Error(job.error || 'Processing failed');
+            err.response = { data: { detail: job.error || 'Processing failed' } };
+            throw err;
+        }
+        await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
 };
 export const listPolicies = () => api.get('/policies/');
 export const getPolicy = (id) => api.get(`/policies/${id}`);
@@ -43,6 +61,44 @@ export const comparePolicies = (idA, idB) =>
 // ───── AI ─────
 export const chat = (query, policyId) =>
     api.post('/ai/chat', { query, policy_id: policyId || null });
+
+// Streams the answer token by token (Server-Sent Events); resolves with the full answer,
+// rejects if generation fails partway.
+export const chatStream = async (query, policyId, onToken) => {
+    const { data: { session } } = await supabase.auth.getSession();
+    const res = await fetch(`${API_BASE}/ai/chat/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            ...(session?.access_token ? { Authorization: `Bearer ${session.access_token}` } : {}),
+        },
+        body: JSON.stringify({ query, policy_id: policyId || null }),
+    });
+    if (!res.ok || !res.body) throw new Error(`Chat stream failed (${res.status})`);
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let answer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const event of events) {
+            if (!event.startsWith('data: ')) continue;
+            const payload = JSON.parse(event.slice(6));
+            if (payload.token) {
+                answer += payload.token;
+                onToken?.(payload.token, answer);
+            }
+            if (payload.error) throw new Error(payload.error);
+            if (payload.done) answer = payload.answer;
+        }
+    }
+    return answer;
+};
 export const translateText = (text, targetLang) =>
     api.post('/ai/translate', { text, target_language: targetLang });
 export const textToSpeech = (text, language) =>